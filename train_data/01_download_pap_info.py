@@ -1,39 +1,82 @@
 import os
-import shutil
-import tempfile
+import json
+import argparse
 from git import Repo
 
-def download_and_prepare_folders():
-    repo_url = 'https://github.com/papyri/idp.data.git'    
-    base_directory_ddb = 'DDB_EpiDoc_XML'
-    base_directory_hgv = 'HGV_meta_EpiDoc'
-    
-    ddb_dest = os.path.join(os.getcwd(), base_directory_ddb)
-    hgv_dest = os.path.join(os.getcwd(), base_directory_hgv)
-    
-    if os.path.exists(ddb_dest) and os.path.exists(hgv_dest):
+base_directory_ddb = 'DDB_EpiDoc_XML'
+base_directory_hgv = 'HGV_meta_EpiDoc'
+checkout_directory = 'idp.data'
+manifest_file = 'idp_manifest.json'
+
+def write_manifest(repo, folders):
+    # Records the commit and the blob id of every file in the folders, so that
+    # ingest.py --incremental can tell which files changed since the last run.
+    commit = repo.head.commit
+    blobs = {}
+    for folder in folders:
+        for item in commit.tree[folder].traverse():
+            if item.type == 'blob':
+                blobs[item.path] = item.hexsha
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({'commit': commit.hexsha, 'blobs': blobs}, f)
+    print(f"Recorded commit {commit.hexsha} and {len(blobs)} blob ids in {manifest_file}.")
+
+def download_and_prepare_folders(repo_url='https://github.com/papyri/idp.data.git'):
+    folders = [base_directory_ddb, base_directory_hgv]
+
+    if os.path.exists(checkout_directory):
+        print(f"{checkout_directory} already exists. Use --update to bring it up to date.")
+        return
+
+    if os.path.exists(base_directory_ddb) and os.path.exists(base_directory_hgv):
         print(f"Directories {base_directory_ddb} and {base_directory_hgv} already exist. Skipping download.")
         return
-    
-    with tempfile.TemporaryDirectory() as temp_dir:
-        print(f"Cloning repository from {repo_url} into {temp_dir}...")
-        Repo.clone_from(repo_url, temp_dir)
-        
-        ddb_src = os.path.join(temp_dir, base_directory_ddb)
-        hgv_src = os.path.join(temp_dir, base_directory_hgv)
-        
-        if not os.path.exists(ddb_dest):
-            shutil.move(ddb_src, ddb_dest)
-            print(f"Downloaded and moved {base_directory_ddb} to the current directory.")
-        else:
-            print(f"{base_directory_ddb} already exists, skipping.")
 
-        if not os.path.exists(hgv_dest):
-            shutil.move(hgv_src, hgv_dest)
-            print(f"Moved {base_directory_hgv} to the current directory.")
+    # Only the latest commit, only the trees up front, and only the blobs of the
+    # two folders on checkout.
+    print(f"Cloning {', '.join(folders)} from {repo_url} into {checkout_directory}...")
+    repo = Repo.clone_from(repo_url, checkout_directory, depth=1, filter='blob:none', sparse=True)
+    repo.git.sparse_checkout('set', *folders)
+    write_manifest(repo, folders)
+
+    for folder in folders:
+        if not os.path.exists(folder):
+            os.symlink(os.path.join(checkout_directory, folder), folder)
+            print(f"Linked {folder} into the current directory.")
         else:
-            print(f"{base_directory_hgv} already exists, skipping.")
+            print(f"{folder} already exists, skipping.")
+
+def update_folders():
+    # Fetches the latest commit of the checked out branch and moves the sparse
+    # checkout to it. The history is one commit deep, so there is nothing to
+    # merge: the working tree is reset to the new commit, keeping local changes
+    # that do not conflict.
+    if not os.path.exists(checkout_directory):
+        print(f"{checkout_directory} does not exist. Run without --update first.")
+        return
+
+    repo = Repo(checkout_directory)
+    old_commit = repo.head.commit.hexsha
+    branch = repo.active_branch.name
+    print(f"Fetching {branch} from {repo.remotes.origin.url}...")
+    repo.remotes.origin.fetch(branch, depth=1)
+    new_commit = repo.commit('FETCH_HEAD').hexsha
+
+    if new_commit == old_commit:
+        print(f"Already up to date at {old_commit}.")
+    else:
+        repo.git.reset('--keep', new_commit)
+        print(f"Updated from {old_commit} to {new_commit}.")
+    write_manifest(repo, [base_directory_ddb, base_directory_hgv])
 
 if __name__ == "__main__":
-    download_and_prepare_folders()
+    parser = argparse.ArgumentParser(description="Download DDB_EpiDoc_XML and HGV_meta_EpiDoc from idp.data.")
+    parser.add_argument('--repo_url', type=str, default='https://github.com/papyri/idp.data.git', help="URL or path of the idp.data repository")
+    parser.add_argument('--update', action='store_true', help=f"Fetch and move the existing {checkout_directory} checkout to the latest commit")
+    args = parser.parse_args()
 
+    if args.update:
+        update_folders()
+    else:
+        download_and_prepare_folders(args.repo_url)
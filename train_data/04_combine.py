@@ -1,41 +1,23 @@
-import json
+import argparse
+from combine import combine
+from store import EntryWriter, store_path
+
+parser = argparse.ArgumentParser(description="Join places and dates with the cleaned editions.")
+parser.add_argument('--editions_file', type=str, default=None, help="Combined JSONL written by ingest.py --combined, read instead of the two per-variant files")
+parser.add_argument('--external_sort', action='store_true', help="Join by sorting the inputs on disk and merging them, in bounded memory, instead of loading them into dicts")
+parser.add_argument('--chunk_size', type=int, default=100000, help="Records sorted in memory at a time with --external_sort")
+parser.add_argument('--tmp_dir', type=str, default=None, help="Directory for the sorted runs of --external_sort")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of the intermediate files, here the united output")
+args = parser.parse_args()
 
 places_and_dates_file = 'data/places_and_dates.tsv'
-output_with_brackets_file = 'data/clean_with_emendations'
+output_with_brackets_file = 'data/clean_with_emendations.jsonl'
 output_without_brackets_file = 'data/clean_without_emendations.jsonl'
-united_output_file = 'data/cleaned_united.jsonl'
-
-places_and_dates = {}
-with open(places_and_dates_file, 'r', encoding='utf-8') as file:
-    for line in file:
-        tm_number, place, date = line.strip().split('\t')
-        places_and_dates[tm_number] = {
-            'place': place,
-            'date': date
-        }
-
-output_with_brackets = {}
-with open(output_with_brackets_file, 'r', encoding='utf-8') as file:
-    for line in file:
-        entry = json.loads(line)
-        output_with_brackets[entry['TM_Number']] = entry['Edition_with_brackets']
-
-output_without_brackets = {}
-with open(output_without_brackets_file, 'r', encoding='utf-8') as file:
-    for line in file:
-        entry = json.loads(line)
-        output_without_brackets[entry['TM_Number']] = entry['Edition_without_brackets']
+united_output_file = store_path('data/cleaned_united.jsonl', args.format)
 
-with open(united_output_file, 'w', encoding='utf-8') as file:
-    for tm_number in places_and_dates:
-        if tm_number in output_with_brackets and tm_number in output_without_brackets:
-            combined_entry = {
-                'TM_Number': tm_number,
-                'place': places_and_dates[tm_number]['place'],
-                'date': places_and_dates[tm_number]['date'],
-                'Edition_with_brackets': output_with_brackets[tm_number],
-                'Edition_without_brackets': output_without_brackets[tm_number]
-            }
-            file.write(json.dumps(combined_entry, ensure_ascii=False) + '\n')
+with EntryWriter(united_output_file) as writer:
+    for entry in combine(places_and_dates_file, [output_with_brackets_file, output_without_brackets_file], args.editions_file,
+                         args.external_sort, args.chunk_size, args.tmp_dir):
+        writer.write(entry)
 
-print(f"Data combined and saved to {united_output_file}")
\ No newline at end of file
+print(f"Data combined and saved to {united_output_file}")
@@ -1,55 +1,29 @@
 import json
-import re
+import argparse
+import pyarrow as pa
+from normalize import normalize_text, normalize_texts
+from store import read_table, store_path, write_table
 
-replacement_map = {
-    'ἋΆΑάαἀἁἂἃἄἅἆἈἉἊἌἍἎἏὰᾁᾈᾲᾳᾴᾶᾷᾼ': 'α',
-    'Ββ': 'β',
-    'Γγ': 'γ',
-    'Δδ∆': 'δ',
-    'ΈΕὲέέέεἐἑἒἓἔἕἘἙἛἜἝ\u1F73': 'ε',
-    'Ζζ': 'ζ',
-    'ΗήηἠἡἢἣἤἥἦἧἨἩἫἬἭἮὴᾐᾑᾒᾓᾔᾕᾖᾗῂῃῄῆῇ': 'η',
-    'Θθ': 'θ',
-    'ΙΊΐίιϊἰἱἲἳἴἵἶἷἸἹἼἽἾὶῑῒῖῗ': 'ι',
-    'Κκ': 'κ',
-    'Λλ': 'λ',
-    'Μμ': 'μ',
-    'Νν': 'ν',
-    'Ξξ': 'ξ',
-    'ΟοόὀὁὂὃὄὅὈὉὊὋὌὍὸόό\u1F79': 'ο',
-    'Ππ': 'π',
-    'ΡρῤῥῬ': 'ρ',
-    'Σςσ': 'σ',
-    'Ττ': 'τ',
-    'ΥΰυϋύὐὑὓὔὕὖὗὙὝὺῢῦῧ': 'υ',
-    'Φφ': 'φ',
-    'Χχ': 'χ',
-    'Ψψ': 'ψ',
-    'ΩΏώῲῳῴῶῷωώὠὡὢὣὤὥὦὧὨὩὪὫὬὭὮὯὼώᾠᾡᾤᾥᾦᾧ\u1F7D': 'ω',
-    'Ϙϙ': 'ϙ',
-    'Ϛϛ': 'ϛ',
-    'ṇ\'\\/`´΄̣‵′᾿᾽᾽': '',
-    ';····\u00B7\u0387': '·',
-    'Ϡϡ': 'ϡ',
-    '†‡': '†'
-}
+parser = argparse.ArgumentParser(description="Normalize the characters of the united editions.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of the intermediate files")
+args = parser.parse_args()
 
-replacement_pattern = {}
-for chars, replacement in replacement_map.items():
-    for char in chars:
-        replacement_pattern[char] = replacement
+united_output_file = store_path('data/cleaned_united.jsonl', args.format)
+cleaned_output_file = store_path('data/normalized_united.jsonl', args.format)
 
-def clean_text(text):
-    return ''.join(replacement_pattern.get(char, char) for char in text)
+if args.format == 'jsonl':
+    with open(united_output_file, 'r', encoding='utf-8') as infile, open(cleaned_output_file, 'w', encoding='utf-8') as outfile:
+        for line in infile:
+            entry = json.loads(line)
+            entry['Edition_with_brackets'] = normalize_text(entry.get('Edition_with_brackets', ''))
+            entry['Edition_without_brackets'] = normalize_text(entry.get('Edition_without_brackets', ''))
+            outfile.write(json.dumps(entry, ensure_ascii=False) + '\n')
+else:
+    # Whole columns at a time; the other columns are passed through untouched.
+    table = read_table(united_output_file)
+    for column in ['Edition_with_brackets', 'Edition_without_brackets']:
+        texts = [text or '' for text in table.column(column).to_pylist()]
+        table = table.set_column(table.schema.get_field_index(column), column, pa.array(normalize_texts(texts), pa.string()))
+    write_table(cleaned_output_file, table)
 
-united_output_file = 'data/cleaned_united.jsonl'
-cleaned_output_file = 'data/normalized_united.jsonl'
-
-with open(united_output_file, 'r', encoding='utf-8') as infile, open(cleaned_output_file, 'w', encoding='utf-8') as outfile:
-    for line in infile:
-        entry = json.loads(line)
-        entry['Edition_with_brackets'] = clean_text(entry.get('Edition_with_brackets', ''))
-        entry['Edition_without_brackets'] = clean_text(entry.get('Edition_without_brackets', ''))
-        outfile.write(json.dumps(entry, ensure_ascii=False) + '\n')
-
-print(f"Cleaned data saved to {cleaned_output_file}")
\ No newline at end of file
+print(f"Cleaned data saved to {cleaned_output_file}")
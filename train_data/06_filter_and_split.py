@@ -1,42 +1,36 @@
-import json
-import random
-import re
+import argparse
+from dedup import THRESHOLD, dedup_sides
+from split import filter_entry, is_train
+from store import EntryWriter, read_entries, store_path
 
-def clean_edition_text(text):
-    text = text.replace("⟨⟩", "")
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+parser = argparse.ArgumentParser(description="Filter the normalized editions and split them into train and test.")
+parser.add_argument('--dedup', action='store_true', help="Keep clusters of near-duplicate texts on one side of the split")
+parser.add_argument('--dedup_index', type=str, default='data/pap_dedup.npz', help="Where to save the near-duplicate index for dedup.py queries")
+parser.add_argument('--threshold', type=float, default=THRESHOLD, help="Estimated Jaccard similarity above which two texts are near duplicates")
+parser.add_argument('--workers', type=int, default=1, help="Number of processes to compute the MinHash signatures with")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of the intermediate files")
+args = parser.parse_args()
 
-input_file = 'data/normalized_united.jsonl'
+input_file = store_path('data/normalized_united.jsonl', args.format)
 
-train_output_file = 'data/pap_train.jsonl'
-test_output_file = 'data/pap_test.jsonl'
+train_output_file = store_path('data/pap_train.jsonl', args.format)
+test_output_file = store_path('data/pap_test.jsonl', args.format)
 
-filtered_entries = []
-with open(input_file, 'r', encoding='utf-8') as file:
-    for line in file:
-        entry = json.loads(line)
-        edition_with_brackets = clean_edition_text(entry.get('Edition_with_brackets', ''))
-        edition_without_brackets = clean_edition_text(entry.get('Edition_without_brackets', ''))
 
-        if len(edition_with_brackets) >= 30 or len(edition_without_brackets) >= 30:
-            entry['Edition_with_brackets'] = edition_with_brackets
-            entry['Edition_without_brackets'] = edition_without_brackets
-            filtered_entries.append(entry)
+def filtered_entries():
+    for entry in read_entries(input_file):
+        entry = filter_entry(entry)
+        if entry is not None:
+            yield entry
 
-random.shuffle(filtered_entries)
 
-split_index = int(0.95 * len(filtered_entries))
+side_of = is_train
+if args.dedup:
+    side_of = dedup_sides(filtered_entries(), is_train, workers=args.workers, threshold=args.threshold, index_file=args.dedup_index).get
 
-train_entries = filtered_entries[:split_index]
-test_entries = filtered_entries[split_index:]
+with EntryWriter(train_output_file) as train_writer, EntryWriter(test_output_file) as test_writer:
+    for entry in filtered_entries():
+        writer = train_writer if side_of(entry['TM_Number']) else test_writer
+        writer.write(entry)
 
-with open(train_output_file, 'w', encoding='utf-8') as train_file:
-    for entry in train_entries:
-        train_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
-
-with open(test_output_file, 'w', encoding='utf-8') as test_file:
-    for entry in test_entries:
-        test_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
-
-print(f"Train and test files created successfully!")
\ No newline at end of file
+print(f"Train and test files created successfully!")
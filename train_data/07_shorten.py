@@ -1,80 +1,90 @@
-import json
-import random
+import argparse
 from transformers import AutoTokenizer
+from store import read_entries, store_path, write_entries
+from shorten import part_lengths, split_at, split_points, token_starts
+from tokens import CACHE_FILE, TokenLengths, encodings, split_key, token_lengths
 
-tokenizer = AutoTokenizer.from_pretrained("meta-llama/Meta-Llama-3.1-8B-Instruct")
+parser = argparse.ArgumentParser(description="Split the editions longer than the token limit into parts.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of the intermediate files")
+parser.add_argument('--tokenizer', type=str, default="meta-llama/Meta-Llama-3.1-8B-Instruct", help="Tokenizer the parts are counted with")
+parser.add_argument('--batch_size', type=int, default=1024, help="Editions tokenized per batch")
+parser.add_argument('--cache', type=str, default=CACHE_FILE, help="Token length cache; only editions not in it are counted. Empty to count everything")
+parser.add_argument('--workers', type=int, default=1, help="Number of processes to count the tokens with")
+args = parser.parse_args()
 
-train_output_file = 'data/pap_train.jsonl'
-test_output_file = 'data/pap_test.jsonl'
-shortened_train_file = 'data/shortened_pap_train.jsonl'
-shortened_test_file = 'data/shortened_pap_test.jsonl'
+tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
 
-def load_jsonl(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return [json.loads(line) for line in f]
-
-def save_jsonl(data, file_path):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for entry in data:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
-
-def split_text(text, parts):
-    approx_part_length = len(text) // parts
-    splits = []
-    last_split = 0
-
-    for _ in range(parts - 1):
-        split_point = last_split + approx_part_length
-        space_idx = text.rfind(' ', last_split, split_point + 50)
-        dot_idx = text.rfind('· ', last_split, split_point + 50)
-
-        if dot_idx != -1 and abs(dot_idx - split_point) <= 50:
-            best_split = dot_idx + 2
-        elif space_idx != -1:
-            best_split = space_idx + 1
-        else:
-            best_split = split_point
-
-        splits.append(text[last_split:best_split])
-        last_split = best_split
-
-    splits.append(text[last_split:])
-    return splits
+train_output_file = store_path('data/pap_train.jsonl', args.format)
+test_output_file = store_path('data/pap_test.jsonl', args.format)
+shortened_train_file = store_path('data/shortened_pap_train.jsonl', args.format)
+shortened_test_file = store_path('data/shortened_pap_test.jsonl', args.format)
 
 def process_entries(data):
     max_tokens_per_part = 699
     processed_data = []
-
-    for entry in data:
-        edition_with_brackets = entry.get('Edition_with_brackets', '')
-        edition_without_brackets = entry.get('Edition_without_brackets', '')
-
-        tokens_with_brackets = len(tokenizer.tokenize(edition_with_brackets))
-
-        parts = max(1, (tokens_with_brackets + max_tokens_per_part - 1) // max_tokens_per_part)  # Rounding up
-
-        if parts > 1:
-            splits_with_brackets = split_text(edition_with_brackets, parts)
-            splits_without_brackets = split_text(edition_without_brackets, parts)
+    editions_with_brackets = [entry.get('Edition_with_brackets', '') for entry in data]
+    editions_without_brackets = [entry.get('Edition_without_brackets', '') for entry in data]
+    lengths = token_lengths(tokenizer, editions_with_brackets + editions_without_brackets, args.cache, args.workers, args.batch_size)
+
+    # The points the editions over the limit are split at come from the cache
+    # when it has them; the other editions are encoded again for the offsets of
+    # their tokens, which give the token counts of the parts too.
+    cache = TokenLengths.load(args.cache) if args.cache else TokenLengths()
+    too_long = [i for i in range(len(data)) if lengths[i] > max_tokens_per_part or lengths[len(data) + i] > max_tokens_per_part]
+    keys = {i: split_key([editions_with_brackets[i], editions_without_brackets[i]], max_tokens_per_part) for i in too_long}
+    points = {i: cache.splits[keys[i]] for i in too_long if keys[i] in cache.splits}
+    to_split = [i for i in too_long if i not in points]
+
+    encodings_with_brackets = encodings(tokenizer, (editions_with_brackets[i] for i in to_split), args.batch_size)
+    encodings_without_brackets = encodings(tokenizer, (editions_without_brackets[i] for i in to_split), args.batch_size)
+    for i, encoding_with_brackets, encoding_without_brackets in zip(to_split, encodings_with_brackets, encodings_without_brackets):
+        starts_with_brackets = token_starts(encoding_with_brackets)
+        starts_without_brackets = token_starts(encoding_without_brackets)
+        points[i] = cache.splits[keys[i]] = split_points(editions_with_brackets[i], starts_with_brackets,
+                                                         editions_without_brackets[i], starts_without_brackets, max_tokens_per_part)
+        for text, starts, cuts in [(editions_with_brackets[i], starts_with_brackets, [point[0] for point in points[i]]),
+                                   (editions_without_brackets[i], starts_without_brackets, [point[1] for point in points[i]])]:
+            for part, length in zip(split_at(text, cuts), part_lengths(text, starts, cuts)):
+                cache.add(part, length)
+
+    if args.cache and to_split:
+        cache.save(args.cache)
+
+    # The parts of every split edition are in the cache; one that is still over
+    # the limit had no cut that split_points() could take.
+    for i in too_long:
+        for field, text, cuts in [('Edition_with_brackets', editions_with_brackets[i], [point[0] for point in points[i]]),
+                                  ('Edition_without_brackets', editions_without_brackets[i], [point[1] for point in points[i]])]:
+            over_limit = [length for length in cache.lookup(split_at(text, cuts)) if length is not None and length > max_tokens_per_part]
+            if over_limit:
+                print(f"Warning: {field} of TM {data[i].get('TM_Number')} keeps a part of {max(over_limit)} tokens, more than {max_tokens_per_part}")
+
+    for i, entry in enumerate(data):
+        edition_with_brackets = editions_with_brackets[i]
+        edition_without_brackets = editions_without_brackets[i]
+
+        if i in points:
+            splits_with_brackets = split_at(edition_with_brackets, [point[0] for point in points[i]])
+            splits_without_brackets = split_at(edition_without_brackets, [point[1] for point in points[i]])
 
             # Create new entries for the splits
-            for i in range(parts):
+            for split_with_brackets, split_without_brackets in zip(splits_with_brackets, splits_without_brackets):
                 new_entry = entry.copy()
-                new_entry['Edition_with_brackets'] = splits_with_brackets[i]
-                new_entry['Edition_without_brackets'] = splits_without_brackets[i]
+                new_entry['Edition_with_brackets'] = split_with_brackets
+                new_entry['Edition_without_brackets'] = split_without_brackets
                 processed_data.append(new_entry)
         else:
             processed_data.append(entry)
 
     return processed_data
 
-train_data = load_jsonl(train_output_file)
-test_data = load_jsonl(test_output_file)
+train_data = list(read_entries(train_output_file))
+test_data = list(read_entries(test_output_file))
 
 shortened_train_data = process_entries(train_data)
 shortened_test_data = process_entries(test_data)
 
-save_jsonl(shortened_train_data, shortened_train_file)
-save_jsonl(shortened_test_data, shortened_test_file)
+write_entries(shortened_train_file, shortened_train_data)
+write_entries(shortened_test_file, shortened_test_data)
 
-print("Processing complete! Files saved as 'shortened_pap_train.jsonl' and 'shortened_pap_test.jsonl'.")
\ No newline at end of file
+print(f"Processing complete! Files saved as '{shortened_train_file}' and '{shortened_test_file}'.")
\ No newline at end of file
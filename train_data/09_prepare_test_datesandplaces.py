@@ -1,6 +1,12 @@
 import json
 import re
 import os
+import argparse
+from store import read_entries, store_path
+
+parser = argparse.ArgumentParser(description="Prepare the date and place test sets.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_test")
+args = parser.parse_args()
 
 def clean_edition_text(text):
     text = text.replace("⟨", "").replace("⟩", "")
@@ -14,8 +20,7 @@ def clean_edition_text(text):
     return text.strip()
 
 def process_entries(input_file, output_file_dates, output_file_places):
-    with open(input_file, 'r', encoding='utf-8') as file:
-        entries = [json.loads(line) for line in file]
+    entries = list(read_entries(input_file, columns=['place', 'date', 'Edition_with_brackets']))
     
     entries = [entry for entry in entries if len(re.sub(r'-', '', entry.get("Edition_with_brackets", ""))) >= 90]
 
@@ -49,7 +54,7 @@ def process_entries(input_file, output_file_dates, output_file_places):
                 }
                 file_places.write(json.dumps(output_entry, ensure_ascii=False) + '\n')
 
-input_file = 'shortened_pap_test.jsonl'
+input_file = store_path('shortened_pap_test.jsonl', args.format)
 output_dir = 'data/test'
 os.makedirs(output_dir, exist_ok=True)
 output_file_dates = 'data/test/test_pap_dates.jsonl'
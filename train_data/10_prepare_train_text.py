@@ -1,158 +1,55 @@
-import re
 import json
-import random
-import numpy as np
 import os 
+import argparse
+import numpy as np
+from masking import HALF, SegmentedCorpus, clean_placeholder_text, hide_numerals
+from store import read_entries, store_path
 
-with open('data/shortened_pap_train.jsonl', 'r', encoding='utf-8') as file:
-    entries = [json.loads(line) for line in file]
-
-def segment_text(text):
-    segments = []
-    
-    numeral_pattern = r"⟨[^-…⟩]+⟩(?:· | )?"
-    lost_letters_pattern = r"-·? |…·? "  
-    preserved_letters_pattern = r"(?<![⟨⟩])[^-…⟨⟩](?![⟨⟩])(?:· | )?"  
-
-    
-    combined_pattern = f"({numeral_pattern})|({lost_letters_pattern})|({preserved_letters_pattern})"
-
-    
-    for match in re.findall(combined_pattern, text):
-        segments.append("".join(match))
-
-    return segments
-
-
-def group_and_count(segments):
-    grouped_sequences = []
-    current_type = None
-    current_group = []
-    
-    for token in segments:
-        if "-" in token or "…" in token:  
-            token_type = "lost"
-        else:
-            token_type = "preserved"
-
-        
-        if token_type == current_type:
-            current_group.append(token)
-        else:
-            if current_group:
-                
-                grouped_sequences.append((len(current_group), current_type, current_group))
-            
-            current_type = token_type
-            current_group = [token]
-
-    
-    if current_group:
-        grouped_sequences.append((len(current_group), current_type, current_group))
-    
-    return grouped_sequences
-
-
-def mask_preserved_tokens(grouped_sequences):
-    
-    masked_segment = []
-
-    
-    preserved_sections = [(i, seq) for i, seq in enumerate(grouped_sequences) if seq[1] == "preserved" and seq[0] >= 3]
-    
-    
-    if not preserved_sections:
-        return grouped_sequences, masked_segment
-    
-    
-    lengths = [seq[0] for _, seq in preserved_sections]
-    weights = np.array(lengths) ** 2  
-
-    
-    chosen_index = random.choices(range(len(preserved_sections)), weights=weights, k=1)[0]
-    chosen_section_index, chosen_section = preserved_sections[chosen_index]
-    
-    total_preserved_tokens = chosen_section[0]
-    
-    
-    max_maskable_tokens = min(20, total_preserved_tokens // 2)
-    if max_maskable_tokens >= 3:
-        mask_count = random.randint(3, max_maskable_tokens)
-        
-        
-        start_index = random.randint(0, total_preserved_tokens - mask_count)
-        
-        
-        masked_segment = chosen_section[2][start_index:start_index + mask_count]
-        
-        
-        for i in range(start_index, start_index + mask_count):
-            chosen_section[2][i] = 'X'
-    
-    return grouped_sequences, masked_segment
-
-
-def reassemble_text_with_placeholder(grouped_sequences):
-    reassembled_text = ""
-    placeholder_inserted = False
-
-    for count, token_type, tokens in grouped_sequences:
-        for token in tokens:
-            if token == "X" and not placeholder_inserted:
-                
-                masked_count = tokens.count("X")
-                reassembled_text += f"[{masked_count} letters missing]"
-                placeholder_inserted = True
-            elif token != "X":
-                reassembled_text += token
-
-    return reassembled_text
+parser = argparse.ArgumentParser(description="Mask the train editions for the first round of text restoration training.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_train")
+parser.add_argument('--seed', type=int, default=None, help="Seed of the masks")
+args = parser.parse_args()
 
+entries = list(read_entries(store_path('data/shortened_pap_train.jsonl', args.format), columns=['Edition_with_brackets', 'Edition_without_brackets']))
 
 output_dir = 'data/train_round_1/'
 os.makedirs(output_dir, exist_ok=True)
 
+rng = np.random.default_rng(args.seed)
+
+# Every edition is masked 20 times. The editions are segmented once into one
+# corpus, and a mask for all of them is drawn at once.
+edition_fields = [[edition_field for edition_field in ["Edition_with_brackets", "Edition_without_brackets"] if edition_field in entry]
+                  for entry in entries]
+corpus = SegmentedCorpus([entry[edition_field] for entry, fields in zip(entries, edition_fields) for edition_field in fields], lost='single')
 
 for repeat_index in range(4):  
     output_entries = []
+    repeats = [corpus.masked_texts(corpus.sample(rng, HALF, min_mask=3)) for _ in range(5)]
 
-    for entry in entries:
-        for _ in range(5):  
-            for edition_field in ["Edition_with_brackets", "Edition_without_brackets"]:
-                if edition_field in entry:
-                    edition_text = entry[edition_field]
-                    
-                    
-                    segmented_text = segment_text(edition_text)
-                    
-                    
-                    grouped_sequences = group_and_count(segmented_text)
-                    
-                    
-                    masked_sequences, masked_segment = mask_preserved_tokens(grouped_sequences)
-                    
-                    
-                    final_text_with_placeholder = reassemble_text_with_placeholder(masked_sequences)
-                    
-                    
-                    revealed_masked_string = "".join(masked_segment)
-                    
-                    
-                    
-                    final_text_with_placeholder = re.sub(r"[⟨⟩]", "", final_text_with_placeholder)
-                    
-                    
-                    revealed_masked_string = re.sub(r"⟨[^⟩]+?⟩", "0", revealed_masked_string)
-                    
-                    
-                    output_entry = {
-                        "messages": [
-                            {"role": "system", "content": "Fill in the missing letters in this papyrus fragment!"},
-                            {"role": "user", "content": final_text_with_placeholder},
-                            {"role": "assistant", "content": revealed_masked_string}
-                        ]
-                    }
-                    output_entries.append(output_entry)
+    edition_index = 0
+    for fields in edition_fields:
+        for masked_texts in repeats:  
+            for field_index in range(len(fields)):
+                final_text_with_placeholder, revealed_masked_string = masked_texts[edition_index + field_index]
+                
+                
+                
+                final_text_with_placeholder = clean_placeholder_text(final_text_with_placeholder)
+                
+                
+                revealed_masked_string = hide_numerals(revealed_masked_string)
+                
+                
+                output_entry = {
+                    "messages": [
+                        {"role": "system", "content": "Fill in the missing letters in this papyrus fragment!"},
+                        {"role": "user", "content": final_text_with_placeholder},
+                        {"role": "assistant", "content": revealed_masked_string}
+                    ]
+                }
+                output_entries.append(output_entry)
+        edition_index += len(fields)
 
     
     output_filename = os.path.join(output_dir, f'train_pap_text_{repeat_index + 1}.jsonl')
@@ -1,6 +1,12 @@
 import json
 import re
 import os  
+import argparse
+from store import read_entries, store_path
+
+parser = argparse.ArgumentParser(description="Prepare the date and place train sets of the first round.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_train")
+args = parser.parse_args()
 
 def clean_edition_text(text):
     
@@ -13,8 +19,7 @@ def process_train_file(input_file, output_file_dates, output_file_places):
     place_entries = []
     
     
-    with open(input_file, 'r', encoding='utf-8') as file:
-        entries = [json.loads(line) for line in file]
+    entries = list(read_entries(input_file, columns=['place', 'date', 'Edition_with_brackets', 'Edition_without_brackets']))
     
     for entry in entries:
         
@@ -82,6 +87,6 @@ def process_train_file(input_file, output_file_dates, output_file_places):
             file.write("\n")
 
 
-process_train_file('data/shortened_pap_train.jsonl', 'data/train_round_1/train_pap_dates.jsonl', 'data/train_round_1/train_pap_places.jsonl')
+process_train_file(store_path('data/shortened_pap_train.jsonl', args.format), 'data/train_round_1/train_pap_dates.jsonl', 'data/train_round_1/train_pap_places.jsonl')
 
 print("Processing complete! Results saved to train_pap_dates.jsonl and train_pap_places.jsonl.")
\ No newline at end of file
@@ -2,30 +2,25 @@ import os
 import re
 import json
 import random
+import argparse
 import numpy as np
+from masking import HALF, SegmentedCorpus, clean_placeholder_text, hide_numerals
+from store import read_entries, store_path
+
+parser = argparse.ArgumentParser(description="Mask and scramble the train editions for the second round of text restoration training.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_train")
+parser.add_argument('--seed', type=int, default=None, help="Seed of the masks, sentence shuffles and hyphen replacements")
+args = parser.parse_args()
 
 
 output_dir = 'data/train_round_2'
 os.makedirs(output_dir, exist_ok=True)
 
+rng = np.random.default_rng(args.seed)
+random.seed(args.seed)
 
-with open('data/shortened_pap_train.jsonl', 'r', encoding='utf-8') as file:
-    entries = [json.loads(line) for line in file]
-
-def segment_text(text):
-    segments = []    
-    text = text.replace("…", "----------")
-    numeral_pattern = r"⟨[^-…⟩]+⟩(?:· | )?"  
-    lost_letters_pattern = r"-·? |----------·? "  
-    preserved_letters_pattern = r"(?<![⟨⟩])[^-…⟨⟩](?![⟨⟩])(?:· | )?" 
-    combined_pattern = f"({numeral_pattern})|({lost_letters_pattern})|({preserved_letters_pattern})"
-
-    
-    for match in re.findall(combined_pattern, text):
-        segments.append("".join(match))
-
-    return segments
 
+entries = list(read_entries(store_path('data/shortened_pap_train.jsonl', args.format), columns=['Edition_with_brackets', 'Edition_without_brackets']))
 
 def scramble_sentences(text):
     
@@ -44,74 +39,6 @@ def scramble_sentences(text):
     return scrambled_text
 
 
-def group_and_count(segments):
-    grouped_sequences = []
-    current_type = None
-    current_group = []
-    
-    for token in segments:
-        if "-" in token or "----------" in token:  
-            token_type = "lost"
-        else:
-            token_type = "preserved"
-
-        
-        if token_type == current_type:
-            current_group.append(token)
-        else:
-            if current_group:
-                
-                grouped_sequences.append((len(current_group), current_type, current_group))
-            
-            current_type = token_type
-            current_group = [token]
-
-    
-    if current_group:
-        grouped_sequences.append((len(current_group), current_type, current_group))
-    
-    return grouped_sequences
-
-
-def mask_preserved_tokens(grouped_sequences):
-    
-    masked_segment = []
-
-    
-    preserved_sections = [(i, seq) for i, seq in enumerate(grouped_sequences) if seq[1] == "preserved" and seq[0] >= 3]
-    
-    
-    if not preserved_sections:
-        return grouped_sequences, masked_segment
-    
-    
-    lengths = [seq[0] for _, seq in preserved_sections]
-    weights = np.array(lengths) ** 2  
-
-    
-    chosen_index = random.choices(range(len(preserved_sections)), weights=weights, k=1)[0]
-    chosen_section_index, chosen_section = preserved_sections[chosen_index]
-    
-    total_preserved_tokens = chosen_section[0]
-    
-    
-    max_maskable_tokens = min(20, total_preserved_tokens // 2)
-    if max_maskable_tokens >= 1:
-        mask_count = random.randint(1, max_maskable_tokens)
-        
-        
-        start_index = random.randint(0, total_preserved_tokens - mask_count)
-        
-        
-        masked_segment = chosen_section[2][start_index:start_index + mask_count]
-        
-        
-        for i in range(start_index, start_index + mask_count):
-            chosen_section[2][i] = 'X'
-    
-    return grouped_sequences, masked_segment
-
-
 def replace_percentage_with_dash(text, percentage):
     characters = list(text)
     indices_to_replace = [i for i, c in enumerate(characters) if c not in ['-', ' ', '…', '·']]
@@ -134,23 +61,6 @@ def replace_percentage_with_dash(text, percentage):
     return ''.join(characters)
 
 
-def reassemble_text_with_placeholder(grouped_sequences):
-    reassembled_text = ""
-    placeholder_inserted = False
-
-    for count, token_type, tokens in grouped_sequences:
-        for token in tokens:
-            if token == "X" and not placeholder_inserted:
-                
-                masked_count = tokens.count("X")
-                reassembled_text += f"[{masked_count} letters missing]"
-                placeholder_inserted = True
-            elif token != "X":
-                reassembled_text += token
-
-    return reassembled_text
-
-
 def count_valid_characters(text):
     
     clean_text = re.sub(r"[ …·-]", "", text)
@@ -162,30 +72,15 @@ def post_process_text(text):
     return re.sub(r"-\s-", "--", text)
 
 
-def process_entry(edition_text, scramble=False):
+def process_entry(masked_texts):
+    # The examples of an edition from its masks, one for every percentage of
+    # the remaining letters that is replaced with hyphens.
     results = []
 
-    
-    text_to_process = scramble_sentences(edition_text) if scramble else edition_text
-
-    
-    if not text_to_process.strip():
-        return results  
-
-    
-    for percent in [0, 5, 10, 15, 20, 25]:
-        
-        segmented_text = segment_text(text_to_process)
-        grouped_sequences = group_and_count(segmented_text)
+    for percent, (final_text_with_placeholder, revealed_masked_string) in zip([0, 5, 10, 15, 20, 25], masked_texts):
         
-        
-        masked_sequences, masked_segment = mask_preserved_tokens(grouped_sequences)
-        final_text_with_placeholder = reassemble_text_with_placeholder(masked_sequences)
-
-        
-        final_text_with_placeholder = re.sub(r"[⟨⟩]", "", final_text_with_placeholder)  
-        revealed_masked_string = "".join(masked_segment)
-        revealed_masked_string = re.sub(r"⟨[^⟩]+?⟩", "0", revealed_masked_string)  
+        final_text_with_placeholder = clean_placeholder_text(final_text_with_placeholder)  
+        revealed_masked_string = hide_numerals(revealed_masked_string)  
         
         
         masked_text = replace_percentage_with_dash(final_text_with_placeholder, percent)
@@ -202,23 +97,32 @@ def process_entry(edition_text, scramble=False):
     return results
 
 
+# The edition of every entry that is trained on: the first with 50 letters.
+edition_texts = []
+for entry in entries:
+    for edition_field in ["Edition_with_brackets", "Edition_without_brackets"]:
+        if edition_field in entry:
+            edition_text = entry[edition_field]
+            
+            
+            if count_valid_characters(edition_text) >= 50:
+                edition_texts.append(edition_text)
+                break  
+
+# The editions are segmented once into one corpus, their scrambled versions
+# once a round, and the six masks of every edition are drawn for all of them
+# at once.
+corpus = SegmentedCorpus(edition_texts, lost='expanded', expand_ellipsis=True)
+
 for round_number in range(1, 11):
     output_entries = []
+    scrambled_corpus = SegmentedCorpus([scramble_sentences(edition_text) for edition_text in edition_texts], lost='expanded', expand_ellipsis=True)
+    masks = [[round_corpus.masked_texts(round_corpus.sample(rng, HALF)) for _ in range(6)] for round_corpus in [corpus, scrambled_corpus]]
     
     
-    for entry in entries:
-        for edition_field in ["Edition_with_brackets", "Edition_without_brackets"]:
-            if edition_field in entry:
-                edition_text = entry[edition_field]
-                
-                
-                if count_valid_characters(edition_text) >= 50:
-                    
-                    output_entries.extend(process_entry(edition_text, scramble=False))
-                    
-                    
-                    output_entries.extend(process_entry(edition_text, scramble=True))
-                    break  
+    for edition_index in range(len(edition_texts)):
+        for corpus_masks in masks:
+            output_entries.extend(process_entry([masked_texts[edition_index] for masked_texts in corpus_masks]))
 
     
     output_file_path = os.path.join(output_dir, f'train_pap_text_{round_number}.jsonl')
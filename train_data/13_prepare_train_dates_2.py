@@ -2,6 +2,12 @@ import os
 import re
 import json
 import random
+import argparse
+from store import read_entries, store_path
+
+parser = argparse.ArgumentParser(description="Prepare the date train sets of the second round.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_train")
+args = parser.parse_args()
 
 
 output_dir = 'data/round_2'
@@ -95,8 +101,7 @@ for round_number in range(1, 11):
     output_entries = []
 
     
-    with open('data/shortened_pap_train.jsonl', 'r', encoding='utf-8') as f:
-        entries = [json.loads(line.strip()) for line in f]
+    entries = read_entries(store_path('data/shortened_pap_train.jsonl', args.format), columns=['date', 'Edition_with_brackets', 'Edition_without_brackets'])
 
     
     for entry in entries:
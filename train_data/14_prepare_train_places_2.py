@@ -2,6 +2,12 @@ import os
 import json
 import re
 import random
+import argparse
+from store import read_entries, store_path
+
+parser = argparse.ArgumentParser(description="Prepare the place train sets of the second round.")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of shortened_pap_train")
+args = parser.parse_args()
 
 
 output_dir = 'data/train_round_2'
@@ -91,8 +97,7 @@ for round_number in range(1, 11):
     output_entries = []
 
     
-    with open('data/shortened_pap_train.jsonl', 'r', encoding='utf-8') as file:
-        entries = [json.loads(line.strip()) for line in file]
+    entries = read_entries(store_path('data/shortened_pap_train.jsonl', args.format), columns=['place', 'Edition_with_brackets', 'Edition_without_brackets'])
 
     
     for entry in entries:
@@ -0,0 +1,47 @@
+import time
+import argparse
+from bs4 import BeautifulSoup
+from epidoc import RULES_WITH_EMENDATIONS, RULES_WITHOUT_EMENDATIONS, clean_characters, clean_characters_reference, edition_divs, render_edition
+from ingest import list_xml_files
+
+# Checks clean_characters() against the original chain of re.sub() passes on
+# every grc edition of the corpus, with and without emendations, and times both.
+
+parser = argparse.ArgumentParser(description="Compare clean_characters() with the original re.sub() chain on the corpus.")
+parser.add_argument('--base_dir', type=str, default='DDB_EpiDoc_XML', help="Directory with the EpiDoc XML files")
+args = parser.parse_args()
+
+# Render the editions once with the character cleanup left out.
+texts = []
+rule_sets = [RULES_WITH_EMENDATIONS, RULES_WITHOUT_EMENDATIONS]
+for xml_file in list_xml_files(args.base_dir):
+    try:
+        with open(xml_file, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f, 'xml')
+    except Exception as e:
+        print(f"Error processing file {xml_file}: {e}")
+        continue
+    for div in edition_divs(soup):
+        for rules in rule_sets:
+            try:
+                texts.append(render_edition(div, rules))
+            except ValueError:
+                pass
+
+total_mb = sum(len(text.encode('utf-8')) for text in texts) / 2**20
+
+start = time.perf_counter()
+reference = [clean_characters_reference(text) for text in texts]
+reference_time = time.perf_counter() - start
+
+start = time.perf_counter()
+compiled = [clean_characters(text) for text in texts]
+compiled_time = time.perf_counter() - start
+
+mismatches = [(text, a, b) for text, a, b in zip(texts, reference, compiled) if a != b]
+for text, a, b in mismatches[:10]:
+    print(f"Mismatch for {text!r}:\n  reference: {a!r}\n  compiled:  {b!r}")
+
+print(f"{len(texts)} editions, {total_mb:.1f} MB, {len(mismatches)} mismatches")
+print(f"re.sub chain: {reference_time:.2f} s ({total_mb / reference_time:.1f} MB/s)")
+print(f"compiled:     {compiled_time:.2f} s ({total_mb / compiled_time:.1f} MB/s), {reference_time / compiled_time:.1f}x faster")
@@ -0,0 +1,49 @@
+import json
+import time
+import argparse
+from collections import Counter
+from normalize import FALLBACK_PATTERN, normalize_text, normalize_text_reference, normalize_texts
+
+# Checks normalize_text() against the original per-character loop of 05 on the
+# editions of cleaned_united.jsonl and times the loop, translate() per text and
+# the batch translate().
+
+parser = argparse.ArgumentParser(description="Compare normalize_text() with the original per-character loop of 05.")
+parser.add_argument('--input_file', type=str, default='data/cleaned_united.jsonl', help="JSONL with the editions to normalize")
+args = parser.parse_args()
+
+texts = []
+with open(args.input_file, 'r', encoding='utf-8') as file:
+    for line in file:
+        entry = json.loads(line)
+        texts.append(entry.get('Edition_with_brackets', ''))
+        texts.append(entry.get('Edition_without_brackets', ''))
+
+total_mb = sum(len(text.encode('utf-8')) for text in texts) / 2**20
+
+start = time.perf_counter()
+reference = [normalize_text_reference(text) for text in texts]
+reference_time = time.perf_counter() - start
+
+start = time.perf_counter()
+translated = [normalize_text(text) for text in texts]
+translated_time = time.perf_counter() - start
+
+start = time.perf_counter()
+batched = normalize_texts(texts)
+batched_time = time.perf_counter() - start
+
+# The two may only differ on the characters of the decomposition fallback.
+without_fallback = {ord(char): None for char in FALLBACK_PATTERN}
+differing = [i for i, (a, b) in enumerate(zip(reference, translated)) if a != b]
+unexpected = [i for i in differing
+              if normalize_text_reference(texts[i].translate(without_fallback)) != normalize_text(texts[i].translate(without_fallback))]
+fallback_chars = Counter(char for i in differing for char in texts[i] if char in FALLBACK_PATTERN)
+
+print(f"{len(texts)} editions, {total_mb:.1f} MB")
+print(f"{len(differing)} editions changed by the decomposition fallback: "
+      + ', '.join(f"{char!r} x{count}" for char, count in fallback_chars.most_common(20)))
+print(f"{len(unexpected)} editions differing otherwise, batch matches per text: {batched == translated}")
+print(f"per-character loop: {reference_time:.2f} s ({total_mb / reference_time:.1f} MB/s)")
+print(f"translate():        {translated_time:.2f} s ({total_mb / translated_time:.1f} MB/s), {reference_time / translated_time:.1f}x faster")
+print(f"batch translate():  {batched_time:.2f} s ({total_mb / batched_time:.1f} MB/s), {reference_time / batched_time:.1f}x faster")
@@ -0,0 +1,60 @@
+import time
+import argparse
+import numpy as np
+from masking import LOST, SegmentedCorpus, group_and_count, segment_text, segment_types
+from store import read_entries
+
+# Checks the segment types of segment_types(), which go by the first code point
+# of every segment, against the per-segment tests of group_and_count() and
+# skip_punctuation on the editions of shortened_pap_train, and checks the runs
+# of SegmentedCorpus against group_and_count(). Times the regex, both
+# classifications and the whole SegmentedCorpus per MB.
+
+parser = argparse.ArgumentParser(description="Compare the segment types of SegmentedCorpus with the per-segment tests.")
+parser.add_argument('--input_file', type=str, default='data/shortened_pap_train.jsonl', help="JSONL, Arrow or Parquet file with the editions to segment")
+args = parser.parse_args()
+
+texts = [entry.get(field) or '' for entry in read_entries(args.input_file, columns=['Edition_with_brackets', 'Edition_without_brackets'])
+         for field in ['Edition_with_brackets', 'Edition_without_brackets']]
+total_mb = sum(len(text.encode('utf-8')) for text in texts) / 2**20
+print(f"{len(texts)} editions, {total_mb:.1f} MB")
+
+for lost in LOST:
+    expand_ellipsis = lost == 'expanded'
+
+    start = time.perf_counter()
+    segmentations = [segment_text(text, lost, expand_ellipsis) for text in texts]
+    regex_time = time.perf_counter() - start
+
+    segments = [token for segmented_text in segmentations for token in segmented_text]
+    joined = ''.join(segments)
+    offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, segments), dtype=np.int64, count=len(segments)), out=offsets[1:])
+
+    start = time.perf_counter()
+    reference_preserved = np.fromiter(("-" not in token and "…" not in token for token in segments), dtype=bool, count=len(segments))
+    reference_punctuation = np.fromiter((token in [" ", "·"] for token in segments), dtype=bool, count=len(segments))
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preserved, punctuation = segment_types(joined, offsets)
+    table_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    corpus = SegmentedCorpus(texts, lost, expand_ellipsis)
+    corpus_time = time.perf_counter() - start
+
+    differing_runs = 0
+    for i, segmented_text in enumerate(segmentations):
+        runs = [(length, token_type) for length, token_type, _ in group_and_count(segmented_text)]
+        first_run, last_run = corpus.edition_runs[i], corpus.edition_runs[i + 1]
+        corpus_runs = [(length, 'preserved' if run_preserved else 'lost')
+                       for length, run_preserved in zip(corpus.run_lengths[first_run:last_run].tolist(), corpus.run_preserved[first_run:last_run].tolist())]
+        differing_runs += runs != corpus_runs
+
+    print(f"{lost}: {len(segments)} segments, {np.count_nonzero(preserved != reference_preserved)} preserved and "
+          f"{np.count_nonzero(punctuation != reference_punctuation)} punctuation types differing, {differing_runs} editions with differing runs")
+    print(f"  regex:               {regex_time:.2f} s ({total_mb / regex_time:.1f} MB/s)")
+    print(f"  per-segment types:   {reference_time:.2f} s ({total_mb / reference_time:.1f} MB/s)")
+    print(f"  segment_types():     {table_time:.2f} s ({total_mb / table_time:.1f} MB/s), {reference_time / table_time:.1f}x faster")
+    print(f"  SegmentedCorpus:     {corpus_time:.2f} s ({total_mb / corpus_time:.1f} MB/s)")
@@ -0,0 +1,90 @@
+import json
+from extsort import external_sort, grouped
+
+# The join of 04: places and dates with the cleaned editions, on TM number.
+# Every TM number of the TSV that has both editions gives one entry, at the
+# position of its first row, with the last place, date and editions given for
+# it.
+
+FIELDS = ['Edition_with_brackets', 'Edition_without_brackets']
+
+
+def read_places_and_dates(places_and_dates_file):
+    with open(places_and_dates_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            tm_number, place, date = line.strip().split('\t')
+            yield tm_number, place, date
+
+
+def read_editions(edition_files, editions_file=None):
+    # (TM number, field, text) for every edition, in file order, from the two
+    # per-variant files or from one combined file.
+    if editions_file:
+        files = [(editions_file, FIELDS)]
+    else:
+        files = list(zip(edition_files, [FIELDS[:1], FIELDS[1:]]))
+    for path, file_fields in files:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                entry = json.loads(line)
+                for field in file_fields:
+                    if field in entry or not editions_file:
+                        yield entry['TM_Number'], field, entry[field]
+
+
+def united_entry(tm_number, place, date, editions):
+    return {
+        'TM_Number': tm_number,
+        'place': place,
+        'date': date,
+        'Edition_with_brackets': editions[FIELDS[0]],
+        'Edition_without_brackets': editions[FIELDS[1]]
+    }
+
+
+def join_in_memory(places_and_dates, editions):
+    places_and_dates_by_tm = {}
+    for tm_number, place, date in places_and_dates:
+        places_and_dates_by_tm[tm_number] = (place, date)
+
+    editions_by_tm = {}
+    for tm_number, field, text in editions:
+        editions_by_tm.setdefault(tm_number, {})[field] = text
+
+    for tm_number, (place, date) in places_and_dates_by_tm.items():
+        if len(editions_by_tm.get(tm_number, ())) == len(FIELDS):
+            yield united_entry(tm_number, place, date, editions_by_tm[tm_number])
+
+
+def join_external(places_and_dates, editions, chunk_size=100000, tmp_dir=None):
+    # The same join with the inputs sorted on disk by TM number and merged,
+    # then the joined entries sorted back into the order of the TSV.
+    by_tm = lambda record: (record[0], record[1])
+    places_and_dates = grouped(external_sort(([tm_number, i, place, date] for i, (tm_number, place, date) in enumerate(places_and_dates)),
+                                             by_tm, chunk_size, tmp_dir), key=lambda record: record[0])
+    editions = grouped(external_sort(([tm_number, i, field, text] for i, (tm_number, field, text) in enumerate(editions)),
+                                     by_tm, chunk_size, tmp_dir), key=lambda record: record[0])
+
+    def joined():
+        edition = next(editions, None)
+        for tm_number, rows in places_and_dates:
+            while edition is not None and edition[0] < tm_number:
+                edition = next(editions, None)
+            if edition is None or edition[0] != tm_number:
+                continue
+            texts = {field: text for _, _, field, text in edition[1]}
+            if len(texts) == len(FIELDS):
+                _, _, place, date = rows[-1]
+                yield [rows[0][1], united_entry(tm_number, place, date, texts)]
+
+    for _, entry in external_sort(joined(), lambda record: record[0], chunk_size, tmp_dir):
+        yield entry
+
+
+def combine(places_and_dates_file, edition_files, editions_file=None, external=False, chunk_size=100000, tmp_dir=None):
+    # Yields the united entries.
+    places_and_dates = read_places_and_dates(places_and_dates_file)
+    editions = read_editions(edition_files, editions_file)
+    if external:
+        return join_external(places_and_dates, editions, chunk_size, tmp_dir)
+    return join_in_memory(places_and_dates, editions)
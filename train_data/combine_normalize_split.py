@@ -0,0 +1,50 @@
+import argparse
+from combine import combine
+from dedup import THRESHOLD, dedup_sides
+from normalize import normalize_text
+from split import filter_entry, is_train
+from store import EntryWriter, store_path
+
+# 04, 05 and 06 in one pass: every united entry is normalized, filtered and
+# written to the train or test file as it comes out of the join. Neither
+# cleaned_united.jsonl nor normalized_united.jsonl is written.
+
+parser = argparse.ArgumentParser(description="Join, normalize, filter and split the cleaned editions in one pass (04, 05 and 06).")
+parser.add_argument('--editions_file', type=str, default=None, help="Combined JSONL written by ingest.py --combined, read instead of the two per-variant files")
+parser.add_argument('--external_sort', action='store_true', help="Join by sorting the inputs on disk and merging them, in bounded memory, instead of loading them into dicts")
+parser.add_argument('--chunk_size', type=int, default=100000, help="Records sorted in memory at a time with --external_sort")
+parser.add_argument('--tmp_dir', type=str, default=None, help="Directory for the sorted runs of --external_sort")
+parser.add_argument('--dedup', action='store_true', help="Keep clusters of near-duplicate texts on one side of the split; runs the join twice")
+parser.add_argument('--dedup_index', type=str, default='data/pap_dedup.npz', help="Where to save the near-duplicate index for dedup.py queries")
+parser.add_argument('--threshold', type=float, default=THRESHOLD, help="Estimated Jaccard similarity above which two texts are near duplicates")
+parser.add_argument('--workers', type=int, default=1, help="Number of processes to compute the MinHash signatures with")
+parser.add_argument('--format', type=str, choices=['jsonl', 'arrow', 'parquet'], default='jsonl', help="Format of the intermediate files, here the train and test files")
+args = parser.parse_args()
+
+places_and_dates_file = 'data/places_and_dates.tsv'
+output_with_brackets_file = 'data/clean_with_emendations.jsonl'
+output_without_brackets_file = 'data/clean_without_emendations.jsonl'
+train_output_file = store_path('data/pap_train.jsonl', args.format)
+test_output_file = store_path('data/pap_test.jsonl', args.format)
+
+
+def filtered_entries():
+    for entry in combine(places_and_dates_file, [output_with_brackets_file, output_without_brackets_file], args.editions_file,
+                         args.external_sort, args.chunk_size, args.tmp_dir):
+        entry['Edition_with_brackets'] = normalize_text(entry['Edition_with_brackets'])
+        entry['Edition_without_brackets'] = normalize_text(entry['Edition_without_brackets'])
+        entry = filter_entry(entry)
+        if entry is not None:
+            yield entry
+
+
+side_of = is_train
+if args.dedup:
+    side_of = dedup_sides(filtered_entries(), is_train, workers=args.workers, threshold=args.threshold, index_file=args.dedup_index).get
+
+with EntryWriter(train_output_file) as train_writer, EntryWriter(test_output_file) as test_writer:
+    for entry in filtered_entries():
+        writer = train_writer if side_of(entry['TM_Number']) else test_writer
+        writer.write(entry)
+
+print(f"Train and test files created successfully!")
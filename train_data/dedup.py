@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+# Near-duplicate detection with MinHash signatures of character shingles and
+# locality-sensitive hashing. Two texts whose shingle sets have a Jaccard
+# similarity of about 0.5 or more land in a common bucket of at least one band
+# with high probability, and only texts that share a bucket are compared, so
+# building and querying the index stay far from quadratic.
+
+SHINGLE_LENGTH = 5
+NUM_PERM = 128
+BANDS = 32
+THRESHOLD = 0.5
+MAX_BUCKET = 1000
+
+NON_LETTERS = re.compile(r'[\W\d_]+')
+_rng = np.random.default_rng(20240917)
+_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+EMPTY_SIGNATURE = np.full(NUM_PERM, 2**32 - 1, dtype=np.uint32)
+
+
+def shingle_hashes(text, length=SHINGLE_LENGTH):
+    # 64-bit hashes of the distinct letter k-grams of the text. Spaces, dots,
+    # hyphens for lost letters and the like are left out.
+    letters = NON_LETTERS.sub('', text)
+    if not letters:
+        return np.empty(0, dtype=np.uint64)
+    code_points = np.frombuffer(letters.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    length = min(length, len(code_points))
+    count = len(code_points) - length + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for i in range(length):
+        hashes = hashes * np.uint64(1000003) + code_points[i:i + count]
+    return np.unique(hashes)
+
+
+def signature(text, chunk_size=4096):
+    hashes = shingle_hashes(text)
+    if hashes.size == 0:
+        return EMPTY_SIGNATURE
+    minimum = EMPTY_SIGNATURE.astype(np.uint64)
+    for start in range(0, hashes.size, chunk_size):
+        chunk = hashes[start:start + chunk_size]
+        permuted = (np.outer(_A, chunk) + _B[:, None]) >> np.uint64(32)
+        minimum = np.minimum(minimum, permuted.min(axis=1))
+    return minimum.astype(np.uint32)
+
+
+def signatures(texts, workers=1, chunksize=64):
+    if workers <= 1:
+        return [signature(text) for text in texts]
+    with Pool(workers) as pool:
+        return pool.map(signature, texts, chunksize=chunksize)
+
+
+def similarity(a, b):
+    # Estimated Jaccard similarity of the shingle sets.
+    return float(np.mean(a == b))
+
+
+class DuplicateIndex:
+    def __init__(self, threshold=THRESHOLD, bands=BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.keys = []
+        self.signatures = []
+        self.train = []
+        self.buckets = [{} for _ in range(bands)]
+
+    def band_keys(self, sig):
+        return [sig[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, sig, train=None):
+        i = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(sig)
+        self.train.append(train)
+        if not np.array_equal(sig, EMPTY_SIGNATURE):
+            for buckets, band_key in zip(self.buckets, self.band_keys(sig)):
+                buckets.setdefault(band_key, []).append(i)
+
+    def candidates(self, sig):
+        found = set()
+        for buckets, band_key in zip(self.buckets, self.band_keys(sig)):
+            found.update(buckets.get(band_key, ()))
+        return found
+
+    def query(self, text, train_only=False):
+        # The (key, similarity) of the indexed texts near the given one, most
+        # similar first; with train_only only those on the train side.
+        sig = signature(text)
+        if np.array_equal(sig, EMPTY_SIGNATURE):
+            return []
+        matches = []
+        for i in self.candidates(sig):
+            if train_only and not self.train[i]:
+                continue
+            score = similarity(sig, self.signatures[i])
+            if score >= self.threshold:
+                matches.append((self.keys[i], score))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def stacked_signatures(self):
+        return np.stack(self.signatures) if self.signatures else np.empty((0, NUM_PERM), dtype=np.uint32)
+
+    def clusters(self, max_bucket=MAX_BUCKET):
+        # A cluster id for every indexed text. Every text of a bucket is
+        # compared with all texts added to it before, so an unrelated text in
+        # the bucket does not keep two near duplicates apart. In a bucket of
+        # more than max_bucket texts, every text is only compared with the
+        # first text of each cluster found in the bucket so far, which bounds
+        # the work however formulaic the corpus is.
+        parent = list(range(len(self.keys)))
+        signatures = self.stacked_signatures()
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for buckets in self.buckets:
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                large = len(members) > max_bucket
+                compared = [members[0]]
+                for current in members[1:]:
+                    close = np.flatnonzero(np.mean(signatures[compared] == signatures[current], axis=1) >= self.threshold)
+                    for k in close:
+                        parent[find(current)] = find(compared[k])
+                    if not large or not len(close):
+                        compared.append(current)
+        return [find(i) for i in range(len(self.keys))]
+
+    def save(self, path):
+        # Written next to the old file and moved over it, so that a failed
+        # save leaves no truncated index behind.
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=np.array(self.keys, dtype=str), signatures=self.stacked_signatures(),
+                     train=np.array([bool(train) for train in self.train], dtype=bool), threshold=self.threshold, bands=self.bands)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(float(data['threshold']), int(data['bands']))
+        for key, sig, train in zip(data['keys'].tolist(), data['signatures'], data['train'].tolist()):
+            index.add(key, sig, train)
+        return index
+
+
+def dedup_sides(entries, side_of, field='Edition_with_brackets', workers=1, threshold=THRESHOLD, index_file=None):
+    # Clusters the near-duplicate texts of the entries and puts every cluster
+    # on the side that side_of() gives the smallest TM number in it. Returns
+    # {TM number: train side or not}, and saves the index to index_file.
+    tm_numbers, texts = [], []
+    for entry in entries:
+        tm_numbers.append(entry['TM_Number'])
+        texts.append(entry.get(field, ''))
+
+    index = DuplicateIndex(threshold)
+    for tm_number, sig in zip(tm_numbers, signatures(texts, workers)):
+        index.add(tm_number, sig)
+
+    clusters = index.clusters()
+    smallest = {}
+    for tm_number, cluster in zip(tm_numbers, clusters):
+        if cluster not in smallest or (len(tm_number), tm_number) < (len(smallest[cluster]), smallest[cluster]):
+            smallest[cluster] = tm_number
+    sides = {tm_number: side_of(smallest[cluster]) for tm_number, cluster in zip(tm_numbers, clusters)}
+
+    index.train = [sides[tm_number] for tm_number in tm_numbers]
+    if index_file:
+        index.save(index_file)
+    moved = sum(side != side_of(tm_number) for tm_number, side in sides.items())
+    print(f"{len(tm_numbers)} texts in {len(smallest)} near-duplicate clusters, {moved} moved to the side of their cluster")
+    return sides
+
+
+def text_of(entry, field):
+    # The field, or for the chat-formatted eval files the user message.
+    if field in entry:
+        return entry[field]
+    return ' '.join(message['content'] for message in entry.get('messages', []) if message['role'] == 'user')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag the texts of a JSONL file that have near duplicates on the train side of the split.")
+    parser.add_argument('--index', type=str, default='data/pap_dedup.npz', help="Index saved by 06_filter_and_split.py --dedup")
+    parser.add_argument('--query_file', type=str, required=True, help="JSONL with the texts to check, e.g. an eval test set")
+    parser.add_argument('--field', type=str, default='Edition_with_brackets', help="Field with the text; chat-formatted files use the user message")
+    parser.add_argument('--output_file', type=str, default=None, help="Write the flagged entries with their near duplicates here")
+    args = parser.parse_args()
+
+    index = DuplicateIndex.load(args.index)
+    flagged = 0
+    total = 0
+    output = open(args.output_file, 'w', encoding='utf-8') if args.output_file else None
+    with open(args.query_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            entry = json.loads(line)
+            total += 1
+            matches = index.query(text_of(entry, args.field), train_only=True)
+            if matches:
+                flagged += 1
+                if output:
+                    entry['near_duplicates'] = [{'TM_Number': key, 'similarity': score} for key, score in matches]
+                    output.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    if output:
+        output.close()
+    print(f"{flagged} of {total} texts have near duplicates on the train side")
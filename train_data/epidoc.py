@@ -0,0 +1,547 @@
+import io
+import re
+import sys
+import copy
+from time import perf_counter
+from contextlib import contextmanager
+from collections import defaultdict
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from lxml import etree
+
+# Tag rules for the grc edition divs, in the order in which 02/03 used to apply
+# them with one find_all() pass per tag. The engine below applies the whole table
+# in a single depth-first traversal. A rule that reads the text of its element
+# (hyphenated supplied/unclear, num, abbr) sees that subtree exactly as the
+# sequential passes did, i.e. with only the rules listed before it applied.
+
+UNWRAP = 'unwrap'
+DECOMPOSE = 'decompose'
+HYPHENATE = 'hyphenate'
+CHOICE = 'choice'
+
+
+def replace_lb(tag, text):
+    return '€€' if tag.get('break') == 'no' else ' '
+
+
+def replace_gap(tag, text):
+    if tag.get('extent') == 'unknown':
+        return '…'
+    elif tag.get('unit') == 'line':
+        return '…'
+    elif tag.get('unit') == 'character' and tag.get('quantity'):
+        try:
+            return '-' * int(tag.get('quantity'))
+        except ValueError:
+            return '-'
+    return None
+
+
+def replace_num(tag, text):
+    return f"⟨{text}⟩"
+
+
+def replace_abbr(tag, text):
+    return f"{text}…"
+
+
+def make_rules(supplied_action):
+    return [
+        ('note', DECOMPOSE),
+        ('ab', UNWRAP),
+        ('expan', UNWRAP),
+        ('ex', UNWRAP),
+        ('supplied', supplied_action),
+        ('unclear', supplied_action),
+        ('handShift', UNWRAP),
+        ('g', UNWRAP),
+        ('app', UNWRAP),
+        ('lem', UNWRAP),
+        ('milestone', UNWRAP),
+        ('rdg', DECOMPOSE),
+        ('add', UNWRAP),
+        ('space', UNWRAP),
+        ('hi', UNWRAP),
+        ('del', DECOMPOSE),
+        ('surplus', DECOMPOSE),
+        ('choice', CHOICE),  # decomposes the <orig>s inside, unwraps the <reg>s
+        ('lb', replace_lb),
+        ('gap', replace_gap),  # left in place when it returns None
+        ('div', UNWRAP),  # type="textpart"
+        ('num', replace_num),
+        ('abbr', replace_abbr),
+    ]
+
+
+RULES_WITH_EMENDATIONS = make_rules(UNWRAP)
+RULES_WITHOUT_EMENDATIONS = make_rules(HYPHENATE)
+
+class RuleTable:
+    def __init__(self, rules):
+        self.rules = {name: (order, action) for order, (name, action) in enumerate(rules, start=1)}
+        self.choice_order = self.rules['choice'][0] if 'choice' in self.rules else 0
+        self.all_rules = len(rules) + 1
+
+
+_tables = {}
+
+
+def rule_table(rules):
+    table = _tables.get(id(rules))
+    if table is None or table[0] is not rules:
+        table = _tables[id(rules)] = (rules, RuleTable(rules))
+    return table[1]
+
+
+# The engine reads the tree through name() and contents(). name() returns the
+# local tag name of an element, TEXT for a string that belongs to the text of
+# the edition and SKIP for anything else (comments, processing instructions).
+TEXT = None
+SKIP = ''
+
+
+class SoupTree:
+    # What Tag.strings yields for documents parsed with the 'xml' builder.
+    string_types = (NavigableString, CData)
+
+    @staticmethod
+    def name(node):
+        if isinstance(node, Tag):
+            return node.name
+        return TEXT if type(node) in SoupTree.string_types else SKIP
+
+    @staticmethod
+    def contents(node):
+        return node.contents
+
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+def collapse_whitespace(text):
+    # BeautifulSoup replaces strings made only of ASCII whitespace with a single
+    # newline or space, which shows in the hyphen counts of supplied/unclear.
+    if text.strip(ASCII_SPACES):
+        return text
+    return '\n' if '\n' in text else ' '
+
+
+class LxmlTree:
+    # lxml elements, laid out like the contents of the corresponding Tag:
+    # the text, then every child followed by its tail.
+    @staticmethod
+    def name(node):
+        if isinstance(node, str):
+            return TEXT
+        tag = node.tag
+        if not isinstance(tag, str):
+            return SKIP
+        return tag.rpartition('}')[2]
+
+    @staticmethod
+    def contents(node):
+        contents = []
+        if node.text:
+            contents.append(collapse_whitespace(node.text))
+        for child in node:
+            contents.append(child)
+            if child.tail:
+                contents.append(collapse_whitespace(child.tail))
+        return contents
+
+
+def is_edition(tree, node):
+    return tree.name(node) == 'div' and node.get('type') == 'edition'
+
+
+def flattened_children(tree, node):
+    # handle_tag() used to move the children of a nested edition div out while
+    # iterating over that same list, so only every second child survived it.
+    contents = tree.contents(node)
+    return contents[::2] if is_edition(tree, node) else contents
+
+
+def render(tree, nodes, table, limit, in_choice, out):
+    # Appends the strings of `nodes` to `out` with every rule whose position in
+    # the table is below `limit` applied.
+    for node in nodes:
+        name = tree.name(node)
+        if not name:
+            if name is TEXT:
+                out.append(node)
+            continue
+
+        if name == 'div' and node.get('type') == 'edition':
+            render(tree, tree.contents(node)[::2], table, limit, in_choice, out)
+            continue
+
+        rule = table.rules.get(name)
+        if rule is None or rule[0] >= limit:
+            if name == 'orig' and in_choice and table.choice_order < limit:
+                # The <choice> rule unwraps every <choice> after decomposing the
+                # <orig>s, which fails on one that sat inside a discarded <orig>.
+                if contains_choice(tree, tree.contents(node), table):
+                    raise ValueError("Cannot unwrap a <choice> nested inside a discarded <orig>")
+                continue
+            render(tree, tree.contents(node), table, limit, in_choice, out)
+            continue
+
+        order, action = rule
+        if action == UNWRAP:
+            render(tree, tree.contents(node), table, limit, in_choice, out)
+        elif action == CHOICE:
+            render(tree, tree.contents(node), table, limit, True, out)
+        elif action == HYPHENATE:
+            inner = []
+            render(tree, tree.contents(node), table, order, in_choice, inner)
+            out.append('-' * len(''.join(inner).replace(" ", "")))
+        elif action != DECOMPOSE:
+            inner = []
+            contents = tree.contents(node)
+            render(tree, contents, table, order, in_choice, inner)
+            replacement = action(node, ''.join(inner))
+            if replacement is None:
+                render(tree, contents, table, limit, in_choice, out)
+            else:
+                out.append(replacement)
+
+
+def contains_choice(tree, nodes, table):
+    # Whether a <choice> is still in the tree when the <choice> rule runs.
+    for node in nodes:
+        name = tree.name(node)
+        if not name:
+            continue
+        if name == 'choice':
+            return True
+        rule = table.rules.get(name)
+        if rule is not None and rule[0] < table.choice_order:
+            action = rule[1]
+            if action in (DECOMPOSE, HYPHENATE):
+                continue
+            if callable(action) and action(node, '') is not None:
+                continue
+        if contains_choice(tree, flattened_children(tree, node), table):
+            return True
+    return False
+
+
+def render_edition(div, rules, tree=SoupTree):
+    out = []
+    table = rule_table(rules)
+    render(tree, tree.contents(div), table, table.all_rules, False, out)
+    return ''.join(out).strip()
+
+
+def clean_text(div, rules, tree=SoupTree):
+    return clean_characters(render_edition(div, rules, tree))
+
+
+SPACES = re.compile(r'[\n ]+')
+
+# Character rules, applied in this order after SPACES. Every pattern is a single
+# character class, so the chain maps each character on its own and collapses
+# into one translation table.
+CHARACTER_RULES = [
+    (r'[ﬂⲁⲂⲃⲅⲇⲉⲋⲍⲏⲑ\?ⲓⲕⲗöﬁ\／ⲙⲛⲝⲟⲡⲣⲥⲧⲩⲫⲭⲯⲱⲻⳉⳓ⳨⳿⸌⸍⸗ꜢꜣꜤꜥ⟦⤚⦿⟧●⎛⎜⎝⎞⎟⎠⎧⎨⎩⎫⎬⎭بةتث!"#$&<=>ß@ABC῎῾῏῞῟DEF‘’‚“”„GHIJKLMNOPQRSTUVWXYZ§¨±_abcdefghijklmnopqrstuvwxyz\{\|\}\~áâäçéìíîïòóôõúüıšʹʼʽˉ˙̱̀́̃̅̇̈̉̒̓̔͂͗ͅ]', ''),  # Remove special characters
+    (r'[›※‾⁓⁢⁩­ ‪–—―‖]', ' '),
+    (r'[∶⋮‧•\··\,\.\:]', '·'),
+    (r'[-]', '-'),
+    (r'[0-9]', ''),
+    (r'[]', 'ε'),
+    (r'[]', 'η'),
+    (r'[∂θϑ]', 'θ'),
+    (r'[􏰂]', 'ι'),
+    (r'[]', 'ο'),
+    (r'[὘]', 'υ'),
+    (r'[µ]', 'μ'),
+    (r'[ϕ]', 'φ'),
+    (r'[]', 'ω'),
+    (r'[\n]', ' '),
+    (r'[ϢϣϥϨϩ⁦ϪϫϬϭ𐅵ϮϯϲϹׂء􏰁أؤإئابةتثجح<>خدذرزسشصضطعغـفقكụلمنهوىيٍّپᐧḍḎḏḤḥḪḫṃṭṯṱẖẠẹỈỉ]', '')
+]
+
+
+def compile_character_rules(rules):
+    # Runs every character that any of the classes matches through the whole
+    # chain of re.sub() calls and keeps the ones it changes. All other
+    # characters pass through the chain untouched.
+    for pattern, _ in rules:
+        assert pattern.startswith('[') and pattern.endswith(']') and ']' not in pattern[1:-1]
+    every_character = ''.join(map(chr, range(sys.maxunicode + 1)))
+    matched = set(re.findall('|'.join(pattern for pattern, _ in rules), every_character))
+
+    table = {}
+    for char in matched:
+        result = char
+        for pattern, replacement in rules:
+            result = re.sub(pattern, replacement, result)
+        if result != char:
+            table[ord(char)] = result
+    return table
+
+
+CHARACTER_TABLE = compile_character_rules(CHARACTER_RULES)
+
+# str.translate() looks up every character of a non-ASCII string in the table,
+# which is no faster than the chain it replaces. Scanning for runs of the few
+# characters the table changes and translating only those is.
+CHARACTER_RUNS = re.compile('[' + ''.join(re.escape(chr(c)) for c in sorted(CHARACTER_TABLE)) + ']+')
+
+
+def translate_run(match):
+    return match.group().translate(CHARACTER_TABLE)
+
+
+CHARACTER_PASSES = [
+    ('split', lambda text: ' '.join(text.split())),
+    ('replace', lambda text: text.replace("€€ ", "").replace(" €€", "").replace("€€", "").replace(" ,", ",").replace(" .", ".").replace("\"", "").replace("#", "")),
+    ('spaces', lambda text: SPACES.sub(' ', text)),
+    ('characters', lambda text: CHARACTER_RUNS.sub(translate_run, text)),
+]
+
+
+def clean_characters(text_content):
+    for _, clean_pass in CHARACTER_PASSES:
+        text_content = clean_pass(text_content)
+    return text_content
+
+
+def clean_characters_reference(text_content):
+    # The original chain of re.sub() passes, kept to check clean_characters()
+    # against (see benchmark_clean_characters.py).
+    text_content = ' '.join(text_content.split())
+    text_content = text_content.replace("€€ ", "").replace(" €€", "").replace("€€", "").replace(" ,", ",").replace(" .", ".").replace("\"", "").replace("#", "")
+
+    replacements = [(SPACES.pattern, ' ')] + CHARACTER_RULES
+
+    for pattern, replacement in replacements:
+        text_content = re.sub(pattern, replacement, text_content)
+
+    return text_content
+
+
+class Profile:
+    # Wall time per tag and per character pass, and the number of elements the
+    # engine went through per tag. An element's time excludes the elements
+    # inside it; hyphenated and replaced elements count their inner elements
+    # twice, as the engine renders them twice.
+    def __init__(self):
+        self.seconds = 0.0
+        self.tag_time = defaultdict(float)
+        self.tag_count = defaultdict(int)
+        self.pass_time = defaultdict(float)
+        self.stack = []
+
+    def merge(self, other):
+        self.seconds += other.seconds
+        for name, seconds in other.tag_time.items():
+            self.tag_time[name] += seconds
+        for name, count in other.tag_count.items():
+            self.tag_count[name] += count
+        for name, seconds in other.pass_time.items():
+            self.pass_time[name] += seconds
+
+
+_profile = None
+render_plain = render
+clean_characters_plain = clean_characters
+
+
+def render_profiled(tree, nodes, table, limit, in_choice, out):
+    # Stands in for render() while profiling: renders every element on its own
+    # through the plain render(), whose recursive calls come back here.
+    profile = _profile
+    for node in nodes:
+        name = tree.name(node)
+        if not name:
+            render_plain(tree, (node,), table, limit, in_choice, out)
+            continue
+        profile.tag_count[name] += 1
+        profile.stack.append(0.0)
+        start = perf_counter()
+        try:
+            render_plain(tree, (node,), table, limit, in_choice, out)
+        finally:
+            elapsed = perf_counter() - start
+            profile.tag_time[name] += elapsed - profile.stack.pop()
+            if profile.stack:
+                profile.stack[-1] += elapsed
+
+
+def clean_characters_profiled(text_content):
+    for name, clean_pass in CHARACTER_PASSES:
+        start = perf_counter()
+        text_content = clean_pass(text_content)
+        _profile.pass_time[name] += perf_counter() - start
+    return text_content
+
+
+@contextmanager
+def profiling(profile):
+    # Records into `profile` what the engine does inside the block.
+    global _profile, render, clean_characters
+    _profile, render, clean_characters = profile, render_profiled, clean_characters_profiled
+    try:
+        yield profile
+    finally:
+        _profile, render, clean_characters = None, render_plain, clean_characters_plain
+
+
+def extract_tm_number(soup):
+    idno_tm_tag = soup.find('idno', type='TM')
+    return idno_tm_tag.get_text(strip=True) if idno_tm_tag else 'null'
+
+
+def is_grc_edition(tag):
+    return is_edition(SoupTree, tag) and tag.get('xml:lang') == 'grc'
+
+
+def edition_divs(soup):
+    return soup.find_all('div', {'xml:lang': 'grc', 'type': 'edition'})
+
+
+def clean_edition(div, rules):
+    # An edition nested inside another grc edition was destroyed by handle_tag()
+    # before its own turn came, and always came out empty.
+    if div.find_parent(is_grc_edition) is not None:
+        return ''
+    return clean_text(div, rules)
+
+
+def clean_editions(divs, rules):
+    # Cleans the editions in order until one fails. Returns the texts cleaned so
+    # far and the error, if any.
+    texts = []
+    try:
+        for div in divs:
+            texts.append(clean_edition(div, rules))
+    except Exception as e:
+        return texts, e
+    return texts, None
+
+
+def parse_editions(xml_file, rule_sets):
+    # Returns the TM number of the file and, for every rule set, the cleaned grc
+    # editions and the error that stopped them, if any. xml_file is a path or
+    # the raw bytes of the file, e.g. a blob read from git.
+    if isinstance(xml_file, bytes):
+        soup = BeautifulSoup(io.StringIO(xml_file.decode('utf-8')), 'xml')
+    else:
+        with open(xml_file, 'r', encoding='utf-8') as f:
+            soup = BeautifulSoup(f, 'xml')
+    divs = edition_divs(soup)
+    return extract_tm_number(soup), [clean_editions(divs, rules) for rules in rule_sets]
+
+
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def iter_strings(tree, node):
+    for child in tree.contents(node):
+        name = tree.name(child)
+        if name is TEXT:
+            yield child
+        elif name:
+            yield from iter_strings(tree, child)
+
+
+def iterparse_editions(xml_file, rule_sets):
+    # Same result as parse_editions(), built with lxml.etree.iterparse instead
+    # of a full soup. Each grc edition is cleaned as soon as its end tag arrives
+    # and everything parsed so far is dropped, so memory stays flat however large
+    # the file is. Only the grc editions and the TM idno are kept until they end.
+    slots = []
+    open_editions = []
+    failed = [False] * len(rule_sets)
+    tm_element = None
+    tm_number = 'null'
+    keep = 0
+
+    if isinstance(xml_file, bytes):
+        xml_file = io.BytesIO(xml_file)
+    for event, el in etree.iterparse(xml_file, events=('start', 'end'), recover=True):
+        name = LxmlTree.name(el)
+        is_grc = name == 'div' and el.get('type') == 'edition' and el.get(XML_LANG) == 'grc'
+
+        if event == 'start':
+            if is_grc:
+                # An edition nested in another grc edition always came out empty.
+                slot = [''] * len(rule_sets) if open_editions else [None] * len(rule_sets)
+                slots.append(slot)
+                open_editions.append(slot)
+                keep += 1
+            elif tm_element is None and name == 'idno' and el.get('type') == 'TM':
+                tm_element = el
+                keep += 1
+            continue
+
+        if is_grc:
+            slot = open_editions.pop()
+            for i, rules in enumerate(rule_sets):
+                if slot[i] is None and not failed[i]:
+                    try:
+                        slot[i] = clean_text(el, rules, LxmlTree)
+                    except Exception as e:
+                        slot[i] = e
+                        failed[i] = True
+            keep -= 1
+        elif el is tm_element:
+            tm_number = ''.join(s.strip() for s in iter_strings(LxmlTree, el))
+            keep -= 1
+
+        if not keep:
+            el.clear()
+            parent = el.getparent()
+            if parent is not None:
+                while el.getprevious() is not None:
+                    del parent[0]
+
+    results = []
+    for i in range(len(rule_sets)):
+        texts = []
+        error = None
+        for slot in slots:
+            if not isinstance(slot[i], str):
+                error = slot[i]
+                break
+            texts.append(slot[i])
+        results.append((texts, error))
+    return tm_number, results
+
+
+def extract_fragment(xml_file):
+    # The TM idno and the grc editions of a file cut out into a small document
+    # that both backends turn into the same editions as the whole file. This is
+    # what the edition cache of ingest.py stores.
+    if isinstance(xml_file, bytes):
+        xml_file = io.BytesIO(xml_file)
+    root = etree.parse(xml_file, etree.XMLParser(recover=True)).getroot()
+    fragment = etree.Element('editions')
+    if root is None:
+        return etree.tostring(fragment, encoding='utf-8')
+
+    tm_number = None
+    editions = []
+    for el in root.iter():
+        name = LxmlTree.name(el)
+        if tm_number is None and name == 'idno' and el.get('type') == 'TM':
+            tm_number = ''.join(s.strip() for s in iter_strings(LxmlTree, el))
+        elif name == 'div' and el.get('type') == 'edition' and el.get(XML_LANG) == 'grc':
+            # Nested editions come along with the outermost one.
+            if not editions or editions[-1] not in el.iterancestors():
+                editions.append(el)
+
+    if tm_number is not None:
+        etree.SubElement(fragment, 'idno', type='TM').text = tm_number
+    for edition in editions:
+        edition = copy.deepcopy(edition)
+        edition.tail = None
+        fragment.append(edition)
+    return etree.tostring(fragment, encoding='utf-8')
+
+
+BACKENDS = {
+    'soup': parse_editions,
+    'lxml': iterparse_editions,
+}
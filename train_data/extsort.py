@@ -0,0 +1,49 @@
+import os
+import json
+import heapq
+import tempfile
+from itertools import groupby, islice
+
+# Sorting record streams that do not fit in memory: the records are sorted in
+# runs of chunk_size, every run is written to a temporary JSONL file, and the
+# runs are merged back lazily. Records are JSON-serializable lists.
+
+
+def write_run(records, tmp_dir):
+    fd, path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return path
+
+
+def read_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+    os.remove(path)
+
+
+def external_sort(records, key, chunk_size=100000, tmp_dir=None):
+    # Yields the records sorted by key, holding at most chunk_size of them in
+    # memory at a time plus one per run while merging.
+    records = iter(records)
+    runs = []
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            chunk.sort(key=key)
+            runs.append(write_run(chunk, tmp_dir))
+        yield from heapq.merge(*[read_run(path) for path in runs], key=key)
+    finally:
+        for path in runs:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def grouped(records, key):
+    # Groups consecutive records with the same key, as a sorted stream has them.
+    for value, group in groupby(records, key=key):
+        yield value, list(group)
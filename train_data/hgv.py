@@ -0,0 +1,141 @@
+import re
+import json
+import argparse
+from functools import partial
+from multiprocessing import Pool
+from lxml import etree
+from ingest import list_git_xml_files, list_xml_files, read_blob
+
+# Places and dates of the texts from the HGV metadata, one row per HGV file:
+# TM number, origPlace and origDate. A date is written as N±M, the middle of the
+# notBefore/notAfter range and half its length, both truncated to whole years;
+# a `when` date is N±0, a range open at the end N+ and one open at the start N-.
+
+YEAR = re.compile(r'\s*(-?)0*(\d+)')
+
+
+def parse_year(value):
+    match = YEAR.match(value or '')
+    if not match:
+        return None
+    return int(match.group(1) + match.group(2))
+
+
+def format_date(not_before, not_after):
+    if not_before is None and not_after is None:
+        return 'null'
+    if not_after is None:
+        return f'{not_before}+'
+    if not_before is None:
+        return f'{not_after}-'
+    return f'{int((not_before + not_after) / 2)}±{int((not_after - not_before) / 2)}'
+
+
+def extract_place_and_date(xml_file, repo_path=None):
+    # Returns (TM number, place, date) of one HGV file, or None without a TM
+    # number. Only the first origPlace and origDate count; the others are
+    # alternatives.
+    if repo_path:
+        xml_file = read_blob(repo_path, xml_file)
+    root = etree.fromstring(xml_file) if isinstance(xml_file, bytes) else etree.parse(xml_file).getroot()
+
+    tm_number = None
+    for idno in root.iter('{*}idno'):
+        if idno.get('type') == 'TM':
+            tm_number = ''.join(idno.itertext()).strip()
+            break
+    if not tm_number:
+        return None
+
+    place = 'null'
+    orig_place = root.find('.//{*}origPlace')
+    if orig_place is not None:
+        place = ' '.join(''.join(orig_place.itertext()).split()) or 'null'
+
+    date = 'null'
+    orig_date = root.find('.//{*}origDate')
+    if orig_date is not None:
+        when = parse_year(orig_date.get('when'))
+        if when is not None:
+            date = format_date(when, when)
+        else:
+            date = format_date(parse_year(orig_date.get('notBefore')), parse_year(orig_date.get('notAfter')))
+
+    return tm_number, place, date
+
+
+def process_file(xml_file, repo_path=None):
+    try:
+        return extract_place_and_date(xml_file, repo_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def iter_places_and_dates(xml_files, workers=1, chunksize=256, repo_path=None):
+    if workers <= 1:
+        for xml_file in xml_files:
+            yield process_file(xml_file, repo_path)
+        return
+
+    with Pool(workers) as pool:
+        yield from pool.imap(partial(process_file, repo_path=repo_path), xml_files, chunksize=chunksize)
+
+
+def index_file(output_file):
+    return output_file + '.index.json'
+
+
+def load_index(output_file):
+    # TM number -> byte offsets of its rows in the TSV.
+    with open(index_file(output_file), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_rows(output_file, index, tm_number):
+    rows = []
+    with open(output_file, 'rb') as f:
+        for offset in index.get(tm_number, []):
+            f.seek(offset)
+            rows.append(f.readline().decode('utf-8').rstrip('\n').split('\t'))
+    return rows
+
+
+def extract_places_and_dates(base_dir='HGV_meta_EpiDoc', output_file='data/places_and_dates.tsv', workers=1, git_repo=None, rev='HEAD'):
+    if git_repo:
+        _, blobs = list_git_xml_files(git_repo, rev, base_dir)
+        xml_files = list(blobs)
+        sources = list(blobs.values())
+    else:
+        xml_files = sources = list_xml_files(base_dir)
+
+    rows = []
+    for xml_file, (row, error) in zip(xml_files, iter_places_and_dates(sources, workers, repo_path=git_repo)):
+        if error is not None:
+            print(f"Error processing file {xml_file}: {error}")
+        elif row is not None:
+            rows.append(row)
+
+    # Grouped by place with the unknown places last, as in the checked-in file.
+    rows.sort(key=lambda row: (row[1] == 'null', row[1], int(row[0]) if row[0].isdigit() else 0, row[0]))
+
+    index = {}
+    with open(output_file, 'wb') as f:
+        for row in rows:
+            index.setdefault(row[0], []).append(f.tell())
+            f.write(('\t'.join(row) + '\n').encode('utf-8'))
+    with open(index_file(output_file), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    print(f"{len(rows)} rows for {len(index)} TM numbers saved to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the places and dates of the texts from HGV_meta_EpiDoc.")
+    parser.add_argument('--base_dir', type=str, default='HGV_meta_EpiDoc', help="Directory with the HGV metadata XML files")
+    parser.add_argument('--output_file', type=str, default='data/places_and_dates.tsv', help="TSV of TM number, place and date")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to parse the XML files with")
+    parser.add_argument('--git_repo', type=str, help="Read the XML files from this git repository instead of the working tree, e.g. idp.data")
+    parser.add_argument('--rev', type=str, default='HEAD', help="Commit-ish to read the XML files from with --git_repo")
+    args = parser.parse_args()
+
+    extract_places_and_dates(args.base_dir, args.output_file, args.workers, args.git_repo, args.rev)
@@ -0,0 +1,442 @@
+import os
+import csv
+import json
+import mmap
+import hashlib
+import argparse
+from time import perf_counter
+from functools import partial
+from multiprocessing import Pool
+from collections import defaultdict
+from git import Repo
+from epidoc import BACKENDS, RULES_WITH_EMENDATIONS, RULES_WITHOUT_EMENDATIONS, Profile, extract_fragment, profiling
+
+# Both editions are rendered from the same parsed soup, so one parse per file
+# serves every variant.
+VARIANTS = {
+    'with_emendations': (RULES_WITH_EMENDATIONS, 'Edition_with_brackets', 'clean_with_emendations.jsonl'),
+    'without_emendations': (RULES_WITHOUT_EMENDATIONS, 'Edition_without_brackets', 'clean_without_emendations.jsonl'),
+}
+COMBINED_FILE = 'clean_editions.jsonl'
+
+
+def list_xml_files(base_dir):
+    return [os.path.join(root, file)
+            for root, _, files in os.walk(base_dir)
+            for file in files if file.endswith('.xml')]
+
+
+def list_git_xml_files(repo_path, rev, base_dir):
+    # The commit rev resolves to and the blob id of every .xml file under
+    # base_dir in its tree, read from the object database without a checkout.
+    repo = Repo(repo_path)
+    commit = repo.commit(rev)
+    blobs = {os.path.normpath(item.path): item.hexsha
+             for item in commit.tree[base_dir].traverse()
+             if item.type == 'blob' and item.path.endswith('.xml')}
+    repo.close()
+    return commit.hexsha, blobs
+
+
+_repos = {}
+
+
+def read_blob(repo_path, blob):
+    # One Repo, and so one `git cat-file --batch` process, per worker process.
+    key = (os.getpid(), repo_path)
+    if key not in _repos:
+        _repos[key] = Repo(repo_path)
+    return _repos[key].odb.stream(bytes.fromhex(blob)).read()
+
+
+_packs = {}
+
+
+def read_fragment(pack_file, offset, length):
+    key = (os.getpid(), pack_file)
+    if key not in _packs:
+        with open(pack_file, 'rb') as f:
+            _packs[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return _packs[key][offset:offset + length]
+
+
+def close_pack(pack_file):
+    pack = _packs.pop((os.getpid(), pack_file), None)
+    if pack is not None:
+        pack.close()
+
+
+def process_file(xml_file, variants, backend='soup', repo_path=None, cache=False, profile=False):
+    # Returns the records of every variant, the error messages met on the way,
+    # with cache the fragment of the file that holds its grc editions, the blob
+    # id of a file read from disk and with profile the Profile of the file. As
+    # before, a variant that fails on a file keeps the editions it had already
+    # cleaned before the failing one. With repo_path, xml_file is the id of a
+    # blob in that repository; a (pack file, offset, length) tuple is a fragment
+    # from the cache.
+    if profile:
+        start = perf_counter()
+        with profiling(Profile()) as file_profile:
+            result = process_file(xml_file, variants, backend, repo_path, cache)
+        file_profile.seconds = perf_counter() - start
+        return (*result[:4], file_profile)
+
+    records = {name: [] for name in variants}
+    errors = []
+    fragment = None
+    blob = None
+    try:
+        if isinstance(xml_file, tuple):
+            xml_file = read_fragment(*xml_file)
+        else:
+            if repo_path:
+                xml_file = read_blob(repo_path, xml_file)
+            else:
+                with open(xml_file, 'rb') as f:
+                    xml_file = f.read()
+                blob = blob_id(xml_file)
+            if cache:
+                xml_file = fragment = extract_fragment(xml_file)
+        tm_number, results = BACKENDS[backend](xml_file, [VARIANTS[name][0] for name in variants])
+    except Exception as e:
+        return records, [str(e)], fragment, blob, None
+
+    for name, (texts, error) in zip(variants, results):
+        field = VARIANTS[name][1]
+        records[name] = [{"TM_Number": tm_number, field: text} for text in texts]
+        if error is not None:
+            errors.append(str(error))
+
+    return records, errors, fragment, blob, None
+
+
+def iter_processed_files(xml_files, variants, workers=1, backend='soup', chunksize=64, repo_path=None, cache=False, profile=False):
+    # Yields (xml_file, records, errors, fragment, blob, profile) in the order of xml_files.
+    # With more than one worker the files are handed out to a process pool in
+    # chunks and the results are streamed back in order as they complete.
+    if workers <= 1:
+        for xml_file in xml_files:
+            yield (xml_file, *process_file(xml_file, variants, backend, repo_path, cache, profile))
+        return
+
+    with Pool(workers) as pool:
+        results = pool.imap(partial(process_file, variants=variants, backend=backend, repo_path=repo_path, cache=cache, profile=profile),
+                            xml_files, chunksize=chunksize)
+        for xml_file, result in zip(xml_files, results):
+            yield (xml_file, *result)
+
+
+def combine_records(records, variants):
+    # One record per edition div, holding the text of each variant that got
+    # that far in the file.
+    combined = []
+    for name in variants:
+        field = VARIANTS[name][1]
+        for i, record in enumerate(records[name]):
+            if i == len(combined):
+                combined.append({"TM_Number": record["TM_Number"]})
+            combined[i][field] = record[field]
+    return combined
+
+
+def output_files(variants, output_dir, combined):
+    # Maps every output file to the function that picks its entries from the
+    # records of one XML file.
+    if combined:
+        return {os.path.join(output_dir, COMBINED_FILE): lambda records: combine_records(records, variants)}
+    return {os.path.join(output_dir, VARIANTS[name][2]): lambda records, name=name: records[name]
+            for name in variants}
+
+
+def to_jsonl(entries):
+    return ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+
+
+def blob_id(data):
+    # The git blob id of the bytes, as `git hash-object` computes it.
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def blob_hash(path):
+    with open(path, 'rb') as f:
+        return blob_id(f.read())
+
+
+def load_manifest(manifest_file):
+    # The idp.data commit and blob ids recorded by 01_download_pap_info.py,
+    # with the paths made relative to the current directory.
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    root = os.path.dirname(manifest_file)
+    blobs = {os.path.normpath(os.path.join(root, path)): blob for path, blob in manifest['blobs'].items()}
+    return manifest['commit'], blobs
+
+
+def state_file(output_file):
+    return output_file + '.state.json'
+
+
+def load_state(output_file):
+    # The blob id of every XML file an output was built from, with the byte
+    # range of the lines it contributed.
+    if not os.path.exists(output_file) or not os.path.exists(state_file(output_file)):
+        return {'commit': None, 'files': {}}
+    with open(state_file(output_file), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def rule_names(variants):
+    # The action of every tag rule, e.g. 'unwrap/hyphenate' for <supplied>.
+    names = defaultdict(list)
+    for name in variants:
+        for tag, action in VARIANTS[name][0]:
+            action = getattr(action, '__name__', action)
+            if action not in names[tag]:
+                names[tag].append(action)
+    return {tag: '/'.join(actions) for tag, actions in names.items()}
+
+
+def write_profile(report_file, profile, file_times, variants):
+    # Writes the slowest tags, character passes and files first, as CSV if
+    # report_file ends in .csv and as JSON otherwise.
+    rules = rule_names(variants)
+    tags = sorted(profile.tag_time, key=profile.tag_time.get, reverse=True)
+    passes = sorted(profile.pass_time, key=profile.pass_time.get, reverse=True)
+    files = sorted(file_times, key=file_times.get, reverse=True)
+
+    if report_file.endswith('.csv'):
+        with open(report_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name', 'rule', 'seconds', 'count'])
+            writer.writerow(['total', '', '', f'{profile.seconds:.6f}', len(file_times)])
+            for tag in tags:
+                writer.writerow(['tag', tag, rules.get(tag, ''), f'{profile.tag_time[tag]:.6f}', profile.tag_count[tag]])
+            for name in passes:
+                writer.writerow(['pass', name, '', f'{profile.pass_time[name]:.6f}', ''])
+            for xml_file in files:
+                writer.writerow(['file', xml_file, '', f'{file_times[xml_file]:.6f}', ''])
+    else:
+        report = {
+            'files': len(file_times),
+            'seconds': profile.seconds,
+            'tags': [{'tag': tag, 'rule': rules.get(tag), 'seconds': profile.tag_time[tag], 'elements': profile.tag_count[tag]}
+                     for tag in tags],
+            'passes': [{'pass': name, 'seconds': profile.pass_time[name]} for name in passes],
+            'slowest_files': [{'file': xml_file, 'seconds': file_times[xml_file]} for xml_file in files],
+        }
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    print(f"Profile of {len(file_times)} files ({profile.seconds:.2f} s) saved to {report_file}")
+    for tag in tags[:5]:
+        print(f"  <{tag}> {rules.get(tag, '-')}: {profile.tag_time[tag]:.3f} s, {profile.tag_count[tag]} elements")
+    for xml_file in files[:5]:
+        print(f"  {xml_file}: {file_times[xml_file]:.3f} s")
+
+
+def checkpoint_file(outputs):
+    return min(outputs) + '.checkpoint.json'
+
+
+def write_checkpoint(outputs, new_files, checkpoint):
+    # Flushes the partial outputs and records how far they got, so that an
+    # interrupted run can truncate them back to that point and carry on.
+    for f in new_files.values():
+        f.flush()
+        os.fsync(f.fileno())
+    checkpoint['sizes'] = {output_file: f.tell() for output_file, f in new_files.items()}
+    path = checkpoint_file(outputs)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(outputs, written, settings):
+    # The checkpoint of an interrupted run with the same settings whose partial
+    # outputs are still there, or None.
+    path = checkpoint_file(outputs)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint['settings'] != settings:
+        return None
+    if not all(os.path.exists(output_file + '.tmp') and os.path.getsize(output_file + '.tmp') >= checkpoint['sizes'][output_file]
+               for output_file in written):
+        return None
+    return checkpoint
+
+
+def process_xml_files(base_dir, variants=tuple(VARIANTS), output_dir='data', combined=False, workers=1, backend='soup',
+                      incremental=False, manifest_file=None, git_repo=None, rev='HEAD', resume=False, checkpoint_every=1000,
+                      cache_file=None, from_cache=False, profile_file=None):
+    # With cache_file the grc editions of every file parsed are also kept in a
+    # pack of small XML fragments, with an index of the blob id, offset and
+    # length of each one (its state file), and the files whose blob is in the
+    # pack are read from there instead. With from_cache the files are those of
+    # the pack, and the XML tree is neither walked nor read.
+    cache = load_state(cache_file) if cache_file else None
+    # A missing or empty pack would replace the outputs with empty files.
+    if from_cache and not (os.path.exists(cache_file) and os.path.exists(state_file(cache_file))):
+        raise FileNotFoundError(f"No editions pack {cache_file} with its {state_file(cache_file)}")
+    if from_cache and not cache['files']:
+        raise ValueError(f"The editions pack {cache_file} is empty")
+    # With git_repo the files are the blobs under base_dir in the tree of rev,
+    # streamed from the object database, and their ids come with them.
+    if from_cache:
+        commit = cache['commit']
+        blobs = {key: blob for key, (blob, _, _) in cache['files'].items()}
+        xml_files = list(blobs)
+    elif git_repo:
+        commit, blobs = list_git_xml_files(git_repo, rev, base_dir)
+        xml_files = list(blobs)
+    else:
+        xml_files = list_xml_files(base_dir)
+        commit, blobs = None, {}
+        if manifest_file and os.path.exists(manifest_file):
+            commit, blobs = load_manifest(manifest_file)
+    keys = {xml_file: os.path.normpath(xml_file) for xml_file in xml_files}
+    # The blob ids are only needed before parsing to tell the unchanged and the
+    # cached files; otherwise process_file() hashes the bytes it reads anyway.
+    if incremental or (cache and cache['files']):
+        hashes = {xml_file: blobs.get(keys[xml_file]) or blob_hash(xml_file) for xml_file in xml_files}
+    else:
+        hashes = {xml_file: blobs.get(keys[xml_file]) for xml_file in xml_files}
+    cached = {xml_file for xml_file in xml_files
+              if cache is not None and hashes[xml_file] is not None
+              and cache['files'].get(keys[xml_file], [None])[0] == hashes[xml_file]}
+
+    outputs = output_files(variants, output_dir, combined)
+    written = list(outputs) + ([cache_file] if cache_file else [])
+    states = {output_file: load_state(output_file) if incremental else {'commit': None, 'files': {}}
+              for output_file in outputs}
+
+    # The records are written out file by file, and every checkpoint_every
+    # files the outputs are flushed and the last file written is recorded.
+    # With --resume a run picks up after the last checkpoint of an interrupted
+    # run with the same settings.
+    settings = {'variants': list(variants), 'combined': combined, 'backend': backend, 'incremental': incremental, 'commit': commit,
+                'cache_file': cache_file}
+    checkpoint = load_checkpoint(outputs, written, settings) if resume else None
+    start = 0
+    if checkpoint is not None and checkpoint['last_file'] in keys.values():
+        start = list(keys.values()).index(checkpoint['last_file']) + 1
+        print(f"Resuming after {checkpoint['last_file']} ({start} of {len(xml_files)} files done)")
+    else:
+        checkpoint = None
+
+    # With --incremental only the files that were added or changed since the
+    # last run are parsed; the lines of the others are copied over.
+    unchanged = {xml_file for xml_file in xml_files
+                 if hashes[xml_file] is not None and all(state['files'].get(keys[xml_file], [None])[0] == hashes[xml_file] for state in states.values())
+                 and (cache is None or xml_file in cached)}
+    changed = [xml_file for xml_file in xml_files[start:] if xml_file not in unchanged]
+    sources = [tuple([cache_file] + cache['files'][keys[xml_file]][1:]) if xml_file in cached
+               else hashes[xml_file] if git_repo else xml_file
+               for xml_file in changed]
+    results = iter_processed_files(sources, variants, workers, backend, repo_path=git_repo, cache=cache is not None,
+                                   profile=profile_file is not None)
+    # With profile_file every file parsed is timed, and the engine records
+    # where the time goes (see epidoc.Profile).
+    profile = Profile()
+    file_times = {}
+
+    if incremental:
+        current = set(keys.values())
+        deleted = {key for state in states.values() for key in state['files'] if key not in current}
+        previous = {state['commit'] for state in states.values()}
+        print(f"Updating from commit {', '.join(str(c) for c in previous)} to {commit}: "
+              f"{len(changed)} of {len(xml_files)} files added or changed, {len(deleted)} deleted")
+
+    os.makedirs(output_dir, exist_ok=True)
+    old_files = {output_file: open(output_file, 'rb') for output_file, state in states.items() if state['files']}
+    if cache and cache['files']:
+        old_files[cache_file] = open(cache_file, 'rb')
+    if checkpoint is None:
+        new_files = {output_file: open(output_file + '.tmp', 'wb') for output_file in written}
+        new_states = {output_file: {'commit': commit, 'files': {}} for output_file in written}
+    else:
+        new_files = {}
+        for output_file in written:
+            new_files[output_file] = open(output_file + '.tmp', 'r+b')
+            new_files[output_file].truncate(checkpoint['sizes'][output_file])
+            new_files[output_file].seek(0, os.SEEK_END)
+        new_states = checkpoint['states']
+    checkpoint = {'settings': settings}
+
+    for i, xml_file in enumerate(xml_files[start:], start + 1):
+        key = keys[xml_file]
+        if xml_file in unchanged:
+            chunks = {}
+            for output_file in outputs:
+                _, offset, length = states[output_file]['files'][key]
+                old_files[output_file].seek(offset)
+                chunks[output_file] = old_files[output_file].read(length)
+        else:
+            _, records, errors, fragment, blob, file_profile = next(results)
+            hashes[xml_file] = hashes[xml_file] or blob
+            if file_profile is not None:
+                profile.merge(file_profile)
+                file_times[key] = file_profile.seconds
+            for e in errors:
+                print(f"Error processing file {xml_file}: {e}")
+            chunks = {output_file: to_jsonl(entries_of(records)) for output_file, entries_of in outputs.items()}
+            if fragment is not None:
+                chunks[cache_file] = fragment
+
+        if xml_file in cached:
+            _, offset, length = cache['files'][key]
+            old_files[cache_file].seek(offset)
+            chunks[cache_file] = old_files[cache_file].read(length)
+
+        for output_file, chunk in chunks.items():
+            f = new_files[output_file]
+            new_states[output_file]['files'][key] = [hashes[xml_file], f.tell(), len(chunk)]
+            f.write(chunk)
+
+        if i % checkpoint_every == 0:
+            checkpoint.update(last_file=key, states=new_states)
+            write_checkpoint(outputs, new_files, checkpoint)
+
+    for f in list(old_files.values()) + list(new_files.values()):
+        f.close()
+
+    if cache_file:
+        close_pack(cache_file)
+    for output_file in written:
+        os.replace(output_file + '.tmp', output_file)
+        with open(state_file(output_file), 'w', encoding='utf-8') as f:
+            json.dump(new_states[output_file], f)
+        print(f"Data saved to {output_file}")
+    if os.path.exists(checkpoint_file(outputs)):
+        os.remove(checkpoint_file(outputs))
+    if profile_file:
+        write_profile(profile_file, profile, file_times, variants)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the grc editions of DDB_EpiDoc_XML with and without emendations in one pass.")
+    parser.add_argument('--base_dir', type=str, default='DDB_EpiDoc_XML', help="Directory with the EpiDoc XML files")
+    parser.add_argument('--output_dir', type=str, default='data', help="Directory to save the output files")
+    parser.add_argument('--combined', action='store_true', help=f"Write one {COMBINED_FILE} with both editions per record instead of two files")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to parse the XML files with")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='soup', help="Parse whole files with BeautifulSoup, or stream them through lxml iterparse")
+    parser.add_argument('--incremental', action='store_true', help="Only parse the files that changed since the last run and patch the existing outputs")
+    parser.add_argument('--manifest', type=str, default='idp_manifest.json', help="Commit and blob ids written by 01_download_pap_info.py")
+    parser.add_argument('--git_repo', type=str, help="Read the XML files from this git repository instead of the working tree, e.g. idp.data")
+    parser.add_argument('--rev', type=str, default='HEAD', help="Commit-ish to read the XML files from with --git_repo")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument('--checkpoint_every', type=int, default=1000, help="Flush the outputs and write a checkpoint every this many files")
+    parser.add_argument('--cache', type=str, help="Pack file to keep the grc editions of the parsed files in and read them back from, e.g. data/editions.pack")
+    parser.add_argument('--from_cache', action='store_true', help="Clean the editions kept in --cache without walking or reading the XML files")
+    parser.add_argument('--profile', type=str, help="Time every tag rule, character pass and file, and save the report to this .json or .csv file")
+    args = parser.parse_args()
+    if args.from_cache and not args.cache:
+        parser.error("--from_cache needs --cache")
+    if args.from_cache and not (os.path.exists(args.cache) and os.path.exists(state_file(args.cache))):
+        parser.error(f"--from_cache needs the pack {args.cache} and its {state_file(args.cache)}")
+
+    process_xml_files(args.base_dir, output_dir=args.output_dir, combined=args.combined, workers=args.workers, backend=args.backend,
+                      incremental=args.incremental, manifest_file=args.manifest, git_repo=args.git_repo, rev=args.rev,
+                      resume=args.resume, checkpoint_every=args.checkpoint_every, cache_file=args.cache, from_cache=args.from_cache,
+                      profile_file=args.profile)
@@ -0,0 +1,346 @@
+import re
+import random
+import numpy as np
+from array import array
+from collections import namedtuple
+from itertools import accumulate
+
+# Segmenting the editions into letters and masking a run of them, shared by the
+# text restoration scripts (08, 10, 12, 15 and 16). A segment is a numeral in
+# ⟨⟩, a lost letter or a preserved letter, each with the `· ` or ` ` after it;
+# consecutive lost or preserved segments are grouped into runs, and the letters
+# to restore are masked within one preserved run.
+#
+# The scripts differ in a few places, which are parameters here:
+# - lost: what counts as a lost-letter segment. 'runs' takes a run of two or
+#   more hyphens as one segment (08, 15, 16), 'single' only single hyphens and
+#   `…` followed by a space (10), and 'expanded' a `…` expanded to ten hyphens
+#   (12). Hyphens that no pattern matches are dropped, as re.findall did.
+# - expand_ellipsis: replace `…` with ten hyphens before segmenting.
+# - policy: how many letters are masked, see mask_preserved_tokens().
+# - placeholder: what stands in for the masked letters.
+#
+# segment() gives an edition's segments and runs in a form that masking leaves
+# alone, so an edition that is masked many times is segmented once, and mask()
+# draws masks from it with the same random calls as mask_preserved_tokens().
+# SegmentedCorpus holds the segmentations of all editions in numpy arrays and
+# draws a mask for every edition at once, from the same distribution. It types
+# the segments with segment_types() from their first code points (checked and
+# timed against the per-segment tests in benchmark_segmentation.py).
+
+ELLIPSIS = '-' * 10
+NUMERAL = r"⟨[^-…⟩]+⟩(?:· | )?"
+PRESERVED = r"(?<![⟨⟩])[^-…⟨⟩](?![⟨⟩])(?:· | )?"
+LOST = {
+    'runs': r"-{2,}|-·? |…·? ",
+    'single': r"-·? |…·? ",
+    'expanded': r"-·? |----------·? ",
+}
+SEGMENT_PATTERNS = {lost: re.compile(f"{NUMERAL}|{pattern}|{PRESERVED}") for lost, pattern in LOST.items()}
+LOST_STARTS = np.array([ord('-'), ord('…')], dtype=np.uint32)
+PUNCTUATION_SEGMENTS = np.array([ord(' '), ord('·')], dtype=np.uint32)
+
+PLACEHOLDER = "[{} letters missing]"
+BRACKETS = re.compile(r"[⟨⟩]")
+SPACE_BEFORE_HYPHEN = re.compile(r" \-")
+SPACE_AFTER_HYPHEN = re.compile(r"\- ")
+NUMERAL_ANSWER = re.compile(r"⟨[^⟩]+?⟩")
+
+# Mask-length policies.
+CHARACTERS = 'characters'  # 1 to 10 letters and no more than 10 characters (08)
+HALF = 'half'  # min_mask to 20 letters, at most half the run (10, 12)
+FIXED = 'fixed'  # exactly mask_count letters (15, 16)
+
+MAX_MASKED_CHARACTERS = 10
+MAX_MASKED_LETTERS = 20
+
+
+def segment_text(text, lost='runs', expand_ellipsis=False):
+    if expand_ellipsis:
+        text = text.replace("…", ELLIPSIS)
+    return SEGMENT_PATTERNS[lost].findall(text)
+
+
+def group_and_count(segments):
+    # Runs of lost or preserved segments as (length, type, segments).
+    grouped_sequences = []
+    current_type = None
+    current_group = []
+
+    for token in segments:
+        if "-" in token or "…" in token:
+            token_type = "lost"
+        else:
+            token_type = "preserved"
+
+        if token_type == current_type:
+            current_group.append(token)
+        else:
+            if current_group:
+                grouped_sequences.append((len(current_group), current_type, current_group))
+            current_type = token_type
+            current_group = [token]
+
+    if current_group:
+        grouped_sequences.append((len(current_group), current_type, current_group))
+
+    return grouped_sequences
+
+
+def choose_section(grouped_sequences, min_length, weighted):
+    # A preserved run of at least min_length segments, chosen with a weight of
+    # its squared length or uniformly. None if there is none.
+    preserved_sections = [seq for seq in grouped_sequences if seq[1] == "preserved" and seq[0] >= min_length]
+    if not preserved_sections:
+        return None
+    if weighted:
+        weights = np.array([seq[0] for seq in preserved_sections]) ** 2
+        return preserved_sections[random.choices(range(len(preserved_sections)), weights=weights, k=1)[0]]
+    return random.choice(preserved_sections)
+
+
+def mask_span(total_preserved_tokens, span_length, policy, mask_count=None, min_mask=1):
+    # (start, count) of the segments of a run to mask, or None. span_length
+    # gives the number of characters of count segments from start.
+    if policy == CHARACTERS:
+        mask_count = random.randint(1, min(total_preserved_tokens, MAX_MASKED_CHARACTERS))
+        start_index = random.randint(0, total_preserved_tokens - mask_count)
+        while span_length(start_index, mask_count) > MAX_MASKED_CHARACTERS:
+            mask_count -= 1
+        return start_index, mask_count
+    if policy == HALF:
+        max_maskable_tokens = min(MAX_MASKED_LETTERS, total_preserved_tokens // 2)
+        if max_maskable_tokens < min_mask:
+            return None
+        mask_count = random.randint(min_mask, max_maskable_tokens)
+    return random.randint(0, total_preserved_tokens - mask_count), mask_count
+
+
+def mask_preserved_tokens(grouped_sequences, policy=HALF, mask_count=None, min_mask=1, skip_punctuation=False):
+    # Replaces a span of segments of one preserved run with 'X' in place and
+    # returns (grouped_sequences, masked segments). The CHARACTERS and HALF
+    # policies pick among the runs of 3 or more segments, weighted by their
+    # squared length, FIXED uniformly among those of mask_count or more. With
+    # skip_punctuation a span of nothing but spaces and `·` is left unmasked.
+    masked_segment = []
+    if policy == FIXED:
+        chosen_section = choose_section(grouped_sequences, mask_count, weighted=False)
+    else:
+        chosen_section = choose_section(grouped_sequences, 3, weighted=True)
+    if chosen_section is None:
+        return grouped_sequences, masked_segment
+
+    tokens = chosen_section[2]
+    span = mask_span(len(tokens), lambda start, count: sum(len(token) for token in tokens[start:start + count]), policy, mask_count, min_mask)
+    if span is None:
+        return grouped_sequences, masked_segment
+    start_index, mask_count = span
+
+    masked_segment = tokens[start_index:start_index + mask_count]
+    if skip_punctuation and all(token in [" ", "·"] for token in masked_segment):
+        return grouped_sequences, []
+
+    for i in range(start_index, start_index + mask_count):
+        tokens[i] = 'X'
+
+    return grouped_sequences, masked_segment
+
+
+def reassemble_text_with_placeholder(grouped_sequences, placeholder=PLACEHOLDER):
+    # The text with the masked segments replaced by the placeholder, formatted
+    # with their number.
+    reassembled_text = []
+    placeholder_inserted = False
+
+    for count, token_type, tokens in grouped_sequences:
+        for token in tokens:
+            if token == "X" and not placeholder_inserted:
+                reassembled_text.append(placeholder.format(tokens.count("X")))
+                placeholder_inserted = True
+            elif token != "X":
+                reassembled_text.append(token)
+
+    return "".join(reassembled_text)
+
+
+def clean_placeholder_text(text, join_hyphens=False):
+    # Drops the numeral brackets; with join_hyphens also the spaces around
+    # hyphens.
+    text = BRACKETS.sub("", text)
+    if join_hyphens:
+        text = SPACE_BEFORE_HYPHEN.sub("-", text)
+        text = SPACE_AFTER_HYPHEN.sub("-", text)
+    return text
+
+
+def hide_numerals(text):
+    # Numerals in the answer are written as 0.
+    return NUMERAL_ANSWER.sub("0", text)
+
+
+# An edition segmented once: the segments joined into text, the end offset of
+# every segment in it and the runs as (length, type, first segment). A segment
+# that is a literal X would be taken for a mask by
+# reassemble_text_with_placeholder(); editions with one keep their segments
+# so that mask() can go the old way for them.
+Segmentation = namedtuple('Segmentation', ['text', 'ends', 'runs', 'segments'])
+
+
+def segment(text, lost='runs', expand_ellipsis=False):
+    segments = segment_text(text, lost, expand_ellipsis)
+    runs = []
+    first = 0
+    for length, token_type, tokens in group_and_count(segments):
+        runs.append((length, token_type, first))
+        first += length
+    return Segmentation(''.join(segments), array('I', accumulate(map(len, segments))), tuple(runs),
+                        tuple(segments) if 'X' in segments else None)
+
+
+def segment_start(segmentation, i):
+    return segmentation.ends[i - 1] if i else 0
+
+
+def sample_mask(segmentation, policy=HALF, mask_count=None, min_mask=1, skip_punctuation=False):
+    # (first segment, number of segments) to mask, drawn as
+    # mask_preserved_tokens() draws them, or None for no mask.
+    if policy == FIXED:
+        chosen_section = choose_section(segmentation.runs, mask_count, weighted=False)
+    else:
+        chosen_section = choose_section(segmentation.runs, 3, weighted=True)
+    if chosen_section is None:
+        return None
+
+    length, _, first = chosen_section
+    ends = segmentation.ends
+    span = mask_span(length, lambda start, count: ends[first + start + count - 1] - segment_start(segmentation, first + start) if count else 0,
+                     policy, mask_count, min_mask)
+    if span is None or span[1] == 0:
+        return None
+    start, count = first + span[0], span[1]
+
+    if skip_punctuation and all(segmentation.text[segment_start(segmentation, i):ends[i]] in [" ", "·"] for i in range(start, start + count)):
+        return None
+    return start, count
+
+
+def masked_text(segmentation, span, placeholder=PLACEHOLDER):
+    # (text with the placeholder, masked letters) for a span of sample_mask().
+    if span is None:
+        return segmentation.text, ''
+    start, count = span
+    a = segment_start(segmentation, start)
+    b = segmentation.ends[start + count - 1]
+    return segmentation.text[:a] + placeholder.format(count) + segmentation.text[b:], segmentation.text[a:b]
+
+
+def mask(segmentation, policy=HALF, mask_count=None, min_mask=1, skip_punctuation=False, placeholder=PLACEHOLDER):
+    # What mask_preserved_tokens() and reassemble_text_with_placeholder() give
+    # for the edition: (text with the placeholder, masked letters).
+    if segmentation.segments is not None:
+        grouped_sequences = group_and_count(list(segmentation.segments))
+        grouped_sequences, masked_segment = mask_preserved_tokens(grouped_sequences, policy, mask_count, min_mask, skip_punctuation)
+        return reassemble_text_with_placeholder(grouped_sequences, placeholder), "".join(masked_segment)
+    return masked_text(segmentation, sample_mask(segmentation, policy, mask_count, min_mask, skip_punctuation), placeholder)
+
+
+def segment_types(text, offsets):
+    # Whether every segment of the joined segments is preserved and whether
+    # it is a " " or "·", as group_and_count() and skip_punctuation test them.
+    # They go by the first character, looked up in the code points of the
+    # text: only a lost segment has a - or … in it, and it starts with one.
+    first_characters = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)[offsets[:-1]]
+    preserved = ~np.isin(first_characters, LOST_STARTS)
+    punctuation = (np.diff(offsets) == 1) & np.isin(first_characters, PUNCTUATION_SEGMENTS)
+    return preserved, punctuation
+
+
+class SegmentedCorpus:
+    # The segmentations of many editions in flat arrays: the segments of all
+    # editions joined into one string, the offset of every segment in it, and
+    # the runs as first segment, length and type. edition_segments and
+    # edition_runs hold the first segment and the first run of every edition,
+    # and their totals at the end. sample() draws a mask for every edition at
+    # once, which masked_texts() cuts out of the string.
+    def __init__(self, texts, lost='runs', expand_ellipsis=False):
+        segmentations = [segment_text(text, lost, expand_ellipsis) for text in texts]
+        segments = [token for segmented_text in segmentations for token in segmented_text]
+        self.text = ''.join(segments)
+        self.offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, segments), dtype=np.int64, count=len(segments)), out=self.offsets[1:])
+        self.edition_segments = np.zeros(len(segmentations) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, segmentations), dtype=np.int64, count=len(segmentations)), out=self.edition_segments[1:])
+        preserved, punctuation = segment_types(self.text, self.offsets)
+        self.punctuation_before = np.concatenate([[0], np.cumsum(punctuation)])
+
+        # A run starts where the type changes and where an edition starts.
+        run_start = np.ones(len(segments), dtype=bool)
+        run_start[1:] = preserved[1:] != preserved[:-1]
+        run_start[self.edition_segments[:-1][self.edition_segments[:-1] < len(segments)]] = True
+        self.run_starts = np.flatnonzero(run_start)
+        self.run_lengths = np.diff(np.append(self.run_starts, len(segments)))
+        self.run_preserved = preserved[self.run_starts]
+        self.edition_runs = np.searchsorted(self.run_starts, self.edition_segments)
+
+    def __len__(self):
+        return len(self.edition_segments) - 1
+
+    def sample(self, rng, policy=HALF, mask_count=None, min_mask=1, skip_punctuation=False):
+        # (first segments, numbers of segments) of a mask for every edition,
+        # drawn as mask_preserved_tokens() draws one, with a number of 0 for
+        # the editions that are left unmasked. rng is a numpy Generator.
+        if not len(self.run_starts):
+            return self.edition_segments[:-1].copy(), np.zeros(len(self), dtype=np.int64)
+        if policy == FIXED:
+            weights = (self.run_preserved & (self.run_lengths >= mask_count)).astype(np.int64)
+        else:
+            weights = np.where(self.run_preserved & (self.run_lengths >= 3), self.run_lengths ** 2, 0)
+        weights_before = np.concatenate([[0], np.cumsum(weights)])
+        bounds = weights_before[self.edition_runs]
+        totals = np.diff(bounds)
+        masked = totals > 0
+
+        # The run of every edition, by its weight among the runs of the edition.
+        drawn = bounds[:-1] + rng.integers(0, np.maximum(totals, 1))
+        chosen = np.where(masked, np.searchsorted(weights_before, drawn, side='right') - 1, 0)
+        lengths = np.where(masked, self.run_lengths[chosen], 1)
+        firsts = np.where(masked, self.run_starts[chosen], 0)
+
+        if policy == CHARACTERS:
+            counts = rng.integers(1, np.minimum(lengths, MAX_MASKED_CHARACTERS) + 1)
+            starts = firsts + rng.integers(0, lengths - counts + 1)
+            while True:
+                too_long = masked & (counts > 0) & (self.offsets[starts + counts] - self.offsets[starts] > MAX_MASKED_CHARACTERS)
+                if not too_long.any():
+                    break
+                counts = counts - too_long
+        else:
+            if policy == HALF:
+                max_maskable = np.minimum(MAX_MASKED_LETTERS, lengths // 2)
+                masked &= max_maskable >= min_mask
+                counts = rng.integers(min_mask, np.maximum(max_maskable, min_mask) + 1)
+            else:
+                counts = np.full(len(self), mask_count, dtype=np.int64)
+            starts = firsts + rng.integers(0, np.maximum(lengths - counts, 0) + 1)
+
+        starts = np.where(masked, starts, self.edition_segments[:-1])
+        counts = np.where(masked, counts, 0)
+        if skip_punctuation:
+            counts = np.where(self.punctuation_before[starts + counts] - self.punctuation_before[starts] < counts, counts, 0)
+        return starts, counts
+
+    def masked_texts(self, spans, placeholder=PLACEHOLDER):
+        # (text with the placeholder, masked letters) of every edition.
+        starts, counts = spans
+        edition_offsets = self.offsets[self.edition_segments].tolist()
+        mask_starts = self.offsets[starts].tolist()
+        mask_ends = self.offsets[starts + counts].tolist()
+        texts = []
+        for i, count in enumerate(counts.tolist()):
+            start, end = edition_offsets[i], edition_offsets[i + 1]
+            if count:
+                a, b = mask_starts[i], mask_ends[i]
+                texts.append((self.text[start:a] + placeholder.format(count) + self.text[b:end], self.text[a:b]))
+            else:
+                texts.append((self.text[start:end], ''))
+        return texts
@@ -0,0 +1,100 @@
+import sys
+import unicodedata
+
+# Folds the Greek letters of the cleaned editions to unaccented lower case and
+# drops or unifies the remaining marks.
+
+replacement_map = {
+    'ἋΆΑάαἀἁἂἃἄἅἆἈἉἊἌἍἎἏὰᾁᾈᾲᾳᾴᾶᾷᾼ': 'α',
+    'Ββ': 'β',
+    'Γγ': 'γ',
+    'Δδ∆': 'δ',
+    'ΈΕὲέέέεἐἑἒἓἔἕἘἙἛἜἝ\u1F73': 'ε',
+    'Ζζ': 'ζ',
+    'ΗήηἠἡἢἣἤἥἦἧἨἩἫἬἭἮὴᾐᾑᾒᾓᾔᾕᾖᾗῂῃῄῆῇ': 'η',
+    'Θθ': 'θ',
+    'ΙΊΐίιϊἰἱἲἳἴἵἶἷἸἹἼἽἾὶῑῒῖῗ': 'ι',
+    'Κκ': 'κ',
+    'Λλ': 'λ',
+    'Μμ': 'μ',
+    'Νν': 'ν',
+    'Ξξ': 'ξ',
+    'ΟοόὀὁὂὃὄὅὈὉὊὋὌὍὸόό\u1F79': 'ο',
+    'Ππ': 'π',
+    'ΡρῤῥῬ': 'ρ',
+    'Σςσ': 'σ',
+    'Ττ': 'τ',
+    'ΥΰυϋύὐὑὓὔὕὖὗὙὝὺῢῦῧ': 'υ',
+    'Φφ': 'φ',
+    'Χχ': 'χ',
+    'Ψψ': 'ψ',
+    'ΩΏώῲῳῴῶῷωώὠὡὢὣὤὥὦὧὨὩὪὫὬὭὮὯὼώᾠᾡᾤᾥᾦᾧ\u1F7D': 'ω',
+    'Ϙϙ': 'ϙ',
+    'Ϛϛ': 'ϛ',
+    'ṇ\'\\/`´΄̣‵′᾿᾽᾽': '',
+    ';····\u00B7\u0387': '·',
+    'Ϡϡ': 'ϡ',
+    '†‡': '†'
+}
+
+replacement_pattern = {}
+for chars, replacement in replacement_map.items():
+    for char in chars:
+        replacement_pattern[char] = replacement
+
+
+def decomposition_fallback(pattern):
+    # Entries for what the map misses: a precomposed letter whose canonical
+    # decomposition is a mapped letter plus combining marks (e.g. ᾅ, Ὗ) goes
+    # where that letter goes, and the combining diacritics found in the
+    # decompositions of the mapped letters are dropped when they come on their
+    # own, as in decomposed text.
+    diacritics = {mark for char, replacement in pattern.items()
+                  for mark in unicodedata.normalize('NFD', char)[1:] if unicodedata.combining(mark)}
+    fallback = {mark: '' for mark in diacritics if mark not in pattern}
+    for code_point in range(sys.maxunicode + 1):
+        char = chr(code_point)
+        if char in pattern:
+            continue
+        decomposed = unicodedata.normalize('NFD', char)
+        base, marks = decomposed[0], decomposed[1:]
+        if marks and pattern.get(base) and all(unicodedata.combining(mark) for mark in marks):
+            fallback[char] = pattern[base]
+    return fallback
+
+
+FALLBACK_PATTERN = decomposition_fallback(replacement_pattern)
+
+
+def translation_table(pattern):
+    # A list indexed by code point up to the last mapped character: translate()
+    # looks characters up in a list much faster than in a dict, and leaves the
+    # ones past its end alone.
+    table = [chr(code_point) for code_point in range(max(map(ord, pattern)) + 1)]
+    for char, replacement in pattern.items():
+        table[ord(char)] = replacement
+    return table
+
+
+NORMALIZATION_TABLE = translation_table({**FALLBACK_PATTERN, **replacement_pattern})
+BATCH_SEPARATOR = '\0'
+
+
+def normalize_text(text):
+    return text.translate(NORMALIZATION_TABLE)
+
+
+def normalize_texts(texts):
+    # The texts normalized with a single translate() call over all of them,
+    # e.g. for the segments of a whole file.
+    texts = list(texts)
+    if not texts or any(BATCH_SEPARATOR in text for text in texts):
+        return [normalize_text(text) for text in texts]
+    return BATCH_SEPARATOR.join(texts).translate(NORMALIZATION_TABLE).split(BATCH_SEPARATOR)
+
+
+def normalize_text_reference(text):
+    # The original per-character loop of 05, without the decomposition
+    # fallback, kept to check and time normalize_text() against (see
+    # benchmark_normalize.py).
+    return ''.join(replacement_pattern.get(char, char) for char in text)
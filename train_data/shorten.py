@@ -0,0 +1,118 @@
+from bisect import bisect_left, bisect_right
+from difflib import SequenceMatcher
+
+# Splitting the editions that are longer than the token limit of 07 into parts.
+# Every edition is tokenized once; the character offsets of its tokens tell how
+# many tokens any slice of it has. The parts are cut in front of a space that
+# starts a token, so a part re-tokenized on its own has exactly the tokens of
+# its slice of the whole edition: the part after a cut begins with the space
+# and the word it belongs to, and the part before it ends where a token ended.
+# Cuts after a `·` are preferred. The two variants of an edition are cut at the
+# same words, as far as emendations and supplements leave words to match.
+
+
+def token_starts(encoding):
+    return [start for start, end in encoding.offsets]
+
+
+def count(starts, start, end):
+    # Number of tokens that start within [start, end).
+    return bisect_left(starts, end) - bisect_left(starts, start)
+
+
+def space_cuts(text, starts):
+    # The positions of the spaces that start a token.
+    return sorted({start for start in starts if start > 0 and text[start] == ' '})
+
+
+def aligned_cuts(text, other_text, cuts, other_cuts):
+    # (cut in text, cut in other_text) pairs in front of the same word. The
+    # words are matched with difflib, which joins the runs of words the two
+    # variants have in common.
+    if text == other_text:
+        other_set = set(other_cuts)
+        return [(cut, cut) for cut in cuts if cut in other_set]
+    positions = [0] + list(cuts)
+    other_positions = [0] + list(other_cuts)
+    words = [text[a:b].strip() for a, b in zip(positions, positions[1:] + [len(text)])]
+    other_words = [other_text[a:b].strip() for a, b in zip(other_positions, other_positions[1:] + [len(other_text)])]
+    pairs = []
+    for a, b, size in SequenceMatcher(None, words, other_words, autojunk=False).get_matching_blocks():
+        for k in range(size + 1):
+            if 0 < a + k < len(positions) and 0 < b + k < len(other_positions):
+                pair = (positions[a + k], other_positions[b + k])
+                if not pairs or (pair[0] > pairs[-1][0] and pair[1] > pairs[-1][1]):
+                    pairs.append(pair)
+    return pairs
+
+
+def reach(starts, start, length, max_tokens):
+    # The fraction of the rest of a text from start that max_tokens cover.
+    first = bisect_left(starts, start)
+    if len(starts) - first <= max_tokens:
+        return 1.0
+    return (starts[first + max_tokens] - start) / (length - start)
+
+
+def cut_at(starts, start, length, fraction):
+    # The last token start up to the fraction of the rest of a text.
+    if fraction >= 1.0:
+        return length
+    return max(start, starts[bisect_right(starts, start + fraction * (length - start)) - 1])
+
+
+def split_points(text, starts, other_text, other_starts, max_tokens, dot_window=25):
+    # The cuts [(position in text, position in other_text), ...] that leave at
+    # most max_tokens tokens in every part of both texts, unless a stretch of
+    # tokens has no position to cut at (check with part_lengths()). The parts
+    # are about equally long in tokens, and a cut after a `·` within dot_window
+    # tokens of the equal split is taken over a closer cut after a plain space.
+    cuts = aligned_cuts(text, other_text, space_cuts(text, starts), space_cuts(other_text, other_starts))
+    points = []
+    start, other_start = 0, 0
+    while count(starts, start, len(text)) > max_tokens or count(other_starts, other_start, len(other_text)) > max_tokens:
+        remaining = count(starts, start, len(text))
+        parts = max(-(-remaining // max_tokens), -(-count(other_starts, other_start, len(other_text)) // max_tokens))
+        target = remaining / parts
+
+        # Cuts past the last one whose parts both fit; the token counts only
+        # grow along the list.
+        first = bisect_right(cuts, (start, other_start))
+        fitting = []
+        for cut, other_cut in cuts[first:]:
+            if count(starts, start, cut) > max_tokens or count(other_starts, other_start, other_cut) > max_tokens:
+                break
+            if cut > start and other_cut > other_start:
+                fitting.append((cut, other_cut))
+
+        if fitting:
+            def distance(point):
+                return abs(count(starts, start, point[0]) - target)
+            best = min(fitting, key=distance)
+            dots = [point for point in fitting if text[point[0] - 1] == '·' and distance(point) <= dot_window]
+            if dots:
+                best = min(dots, key=distance)
+        else:
+            # No common word boundary in reach: cut both texts at the same
+            # fraction of their rest, as far as their tokens allow.
+            fraction = min(reach(starts, start, len(text), max_tokens), reach(other_starts, other_start, len(other_text), max_tokens))
+            best = (cut_at(starts, start, len(text), fraction), cut_at(other_starts, other_start, len(other_text), fraction))
+            if best == (start, other_start):
+                # Not even one token fits: the rest stays one part over
+                # max_tokens, which the caller has to report.
+                break
+
+        points.append(best)
+        start, other_start = best
+    return points
+
+
+def split_at(text, points):
+    positions = [0] + list(points) + [len(text)]
+    return [text[a:b] for a, b in zip(positions, positions[1:])]
+
+
+def part_lengths(text, starts, points):
+    # The token counts of the parts split_at() gives.
+    positions = [0] + list(points) + [len(text)]
+    return [count(starts, a, b) for a, b in zip(positions, positions[1:])]
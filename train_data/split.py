@@ -0,0 +1,34 @@
+import re
+import hashlib
+
+# Filtering of the normalized editions and the train/test split of 06.
+
+MIN_LENGTH = 30
+TRAIN_FRACTION = 0.95
+
+
+def clean_edition_text(text):
+    text = text.replace("⟨⟩", "")
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def filter_entry(entry):
+    # The entry with both editions cleaned, or None if neither is at least
+    # MIN_LENGTH characters long.
+    edition_with_brackets = clean_edition_text(entry.get('Edition_with_brackets', ''))
+    edition_without_brackets = clean_edition_text(entry.get('Edition_without_brackets', ''))
+
+    if len(edition_with_brackets) >= MIN_LENGTH or len(edition_without_brackets) >= MIN_LENGTH:
+        entry['Edition_with_brackets'] = edition_with_brackets
+        entry['Edition_without_brackets'] = edition_without_brackets
+        return entry
+    return None
+
+
+def is_train(tm_number):
+    # Puts a TM number on the train side if a stable hash of it falls in the
+    # first TRAIN_FRACTION of the range, so that every entry can be routed on
+    # its own and keeps its side when the corpus is rebuilt or grows.
+    digest = hashlib.sha1(str(tm_number).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') < TRAIN_FRACTION * 2**64
@@ -0,0 +1,104 @@
+import os
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# The intermediate files of the pipeline (cleaned_united, normalized_united,
+# pap_train/pap_test and their shortened versions) as JSONL, or as Arrow IPC or
+# Parquet files with one string column per field. Arrow files are memory-mapped
+# and read without copying; both columnar formats read only the columns asked
+# for. The format follows from the file extension.
+
+COLUMNS = ['TM_Number', 'place', 'date', 'Edition_with_brackets', 'Edition_without_brackets']
+SCHEMA = pa.schema([(column, pa.string()) for column in COLUMNS])
+FORMATS = {'jsonl': '.jsonl', 'arrow': '.arrow', 'parquet': '.parquet'}
+
+
+def store_path(path, store_format='jsonl'):
+    # The path with the extension of the format, e.g. data/pap_train.arrow.
+    return os.path.splitext(path)[0] + FORMATS[store_format]
+
+
+def format_of(path):
+    extension = os.path.splitext(path)[1]
+    for store_format, format_extension in FORMATS.items():
+        if extension == format_extension:
+            return store_format
+    return 'jsonl'
+
+
+def read_table(path, columns=None):
+    # A pyarrow Table of the columns, backed by the memory map for Arrow files.
+    if format_of(path) == 'arrow':
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table.select(columns) if columns else table
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def read_entries(path, columns=None, batch_size=1024):
+    # Yields the entries as dicts. JSONL entries come whole; from the columnar
+    # formats only the given columns are read.
+    if format_of(path) == 'jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+        return
+    for batch in read_table(path, columns).to_batches(batch_size):
+        yield from batch.to_pylist()
+
+
+def write_table(path, table):
+    if format_of(path) == 'arrow':
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, path)
+
+
+class EntryWriter:
+    # Writes entries one at a time, in batches of batch_size for the columnar
+    # formats, where only the COLUMNS are kept.
+    def __init__(self, path, batch_size=1024):
+        self.store_format = format_of(path)
+        self.batch_size = batch_size
+        self.rows = []
+        if self.store_format == 'jsonl':
+            self.file = open(path, 'w', encoding='utf-8')
+        elif self.store_format == 'arrow':
+            self.file = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.file, SCHEMA)
+        else:
+            self.file = None
+            self.writer = pq.ParquetWriter(path, SCHEMA)
+
+    def write(self, entry):
+        if self.store_format == 'jsonl':
+            self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            return
+        self.rows.append(entry)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_batch(pa.RecordBatch.from_pylist(self.rows, schema=SCHEMA))
+            self.rows = []
+
+    def close(self):
+        if self.store_format != 'jsonl':
+            self.flush()
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_entries(path, entries):
+    with EntryWriter(path) as writer:
+        for entry in entries:
+            writer.write(entry)
@@ -0,0 +1,165 @@
+import os
+import hashlib
+import argparse
+import numpy as np
+from itertools import islice
+from multiprocessing import Pool
+
+# Token counts of the editions. A transformers fast tokenizer wraps a Rust
+# tokenizers.Tokenizer; encoding through it in batches gives the same tokens as
+# tokenizer.tokenize() without building a Python string for every token.
+#
+# The counts are kept in a cache file keyed by a 64-bit hash of the text and
+# tied to a fingerprint of the tokenizer, so reruns only count new texts and
+# other stages can look lengths up without loading the tokenizer. 07 keeps the
+# points it split the long editions at in the same file.
+
+CACHE_FILE = 'data/token_lengths.npz'
+
+
+def backend(tokenizer):
+    # The Rust tokenizer of a transformers fast tokenizer, or the tokenizer
+    # itself if it is already one.
+    return getattr(tokenizer, 'backend_tokenizer', tokenizer)
+
+
+def encodings(tokenizer, texts, batch_size=1024):
+    # Yields the encoding of every text, without special tokens, encoding a
+    # batch at a time.
+    rust_tokenizer = backend(tokenizer)
+    texts = iter(texts)
+    while True:
+        batch = list(islice(texts, batch_size))
+        if not batch:
+            break
+        yield from rust_tokenizer.encode_batch(batch, add_special_tokens=False)
+
+
+def token_counts(tokenizer, texts, batch_size=1024):
+    # len(tokenizer.tokenize(text)) for every text.
+    return [len(encoding) for encoding in encodings(tokenizer, texts, batch_size)]
+
+
+def fingerprint(tokenizer):
+    # A hash of the serialized tokenizer: vocabulary, merges, normalizer and
+    # pre-tokenizer.
+    return hashlib.sha1(backend(tokenizer).to_str().encode('utf-8')).hexdigest()
+
+
+def text_key(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def split_key(texts, max_tokens):
+    return text_key('\0'.join([str(max_tokens)] + list(texts)))
+
+
+class TokenLengths:
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.lengths = {}
+        self.splits = {}
+
+    def get(self, text):
+        # The token count of the text, or None if it was never counted.
+        return self.lengths.get(text_key(text))
+
+    def lookup(self, texts):
+        return [self.lengths.get(text_key(text)) for text in texts]
+
+    def add(self, text, length):
+        self.lengths[text_key(text)] = length
+
+    def save(self, path):
+        # Written next to the old file and moved over it, so that an
+        # interrupted save leaves the old cache intact.
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=np.fromiter(self.lengths.keys(), dtype=np.uint64, count=len(self.lengths)),
+                     lengths=np.fromiter(self.lengths.values(), dtype=np.int32, count=len(self.lengths)),
+                     split_keys=np.fromiter(self.splits.keys(), dtype=np.uint64, count=len(self.splits)),
+                     split_counts=np.array([len(points) for points in self.splits.values()], dtype=np.int32),
+                     split_points=np.array([position for points in self.splits.values() for point in points for position in point], dtype=np.int32),
+                     fingerprint=self.fingerprint or '')
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CACHE_FILE, fingerprint=None):
+        # The cache saved at path. It comes back empty if there is none, or if
+        # it was made with a tokenizer other than the given fingerprint.
+        if not os.path.exists(path):
+            return cls(fingerprint)
+        data = np.load(path)
+        cached_fingerprint = str(data['fingerprint']) or None
+        if fingerprint is not None and cached_fingerprint != fingerprint:
+            return cls(fingerprint)
+        cache = cls(cached_fingerprint)
+        cache.lengths = dict(zip(data['keys'].tolist(), data['lengths'].tolist()))
+        points = data['split_points'].reshape(-1, 2).tolist()
+        start = 0
+        for key, split_count in zip(data['split_keys'].tolist(), data['split_counts'].tolist()):
+            cache.splits[key] = [tuple(point) for point in points[start:start + split_count]]
+            start += split_count
+        return cache
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(serialized_tokenizer):
+    # The workers rebuild the Rust tokenizer from its JSON, and leave the
+    # threading to the processes.
+    global _worker_tokenizer
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    from tokenizers import Tokenizer
+    _worker_tokenizer = Tokenizer.from_str(serialized_tokenizer)
+
+
+def _count_batch(texts):
+    return token_counts(_worker_tokenizer, texts, len(texts))
+
+
+def count_tokens(tokenizer, texts, workers=1, batch_size=1024):
+    # token_counts() spread over worker processes.
+    texts = list(texts)
+    if workers <= 1:
+        return token_counts(tokenizer, texts, batch_size)
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    with Pool(workers, initializer=_init_worker, initargs=(backend(tokenizer).to_str(),)) as pool:
+        return [count for counts in pool.map(_count_batch, batches) for count in counts]
+
+
+def token_lengths(tokenizer, texts, cache_file=CACHE_FILE, workers=1, batch_size=1024):
+    # The token counts of the texts, from the cache where it has them. The
+    # others are counted with count_tokens() and added to the cache.
+    texts = list(texts)
+    cache = TokenLengths.load(cache_file, fingerprint(tokenizer)) if cache_file else TokenLengths(fingerprint(tokenizer))
+    keys = [text_key(text) for text in texts]
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cache.lengths:
+            missing.setdefault(key, text)
+    if missing:
+        cache.lengths.update(zip(missing, count_tokens(tokenizer, missing.values(), workers, batch_size)))
+        if cache_file:
+            cache.save(cache_file)
+    print(f"{len(texts)} texts, {len(texts) - sum(key in missing for key in keys)} token counts from the cache")
+    return [cache.lengths[key] for key in keys]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the tokens of the editions into the token length cache.")
+    parser.add_argument('--input_file', type=str, required=True, help="JSONL, Arrow or Parquet file of entries, e.g. data/shortened_pap_train.jsonl")
+    parser.add_argument('--fields', type=str, nargs='+', default=['Edition_with_brackets', 'Edition_without_brackets'], help="Fields with the texts to count")
+    parser.add_argument('--tokenizer', type=str, default="meta-llama/Meta-Llama-3.1-8B-Instruct", help="Tokenizer to count with")
+    parser.add_argument('--cache', type=str, default=CACHE_FILE, help="Token length cache to read and update")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to tokenize with")
+    parser.add_argument('--max_tokens', type=int, default=850, help="Report the texts longer than this, e.g. max_seq_len of yamls/torchtune.yaml")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    from store import read_entries
+
+    texts = [entry.get(field) or '' for entry in read_entries(args.input_file, columns=args.fields) for field in args.fields]
+    lengths = token_lengths(AutoTokenizer.from_pretrained(args.tokenizer), texts, args.cache, args.workers)
+    print(f"{sum(length > args.max_tokens for length in lengths)} of {len(lengths)} texts have more than {args.max_tokens} tokens")